@@ -0,0 +1,77 @@
+from django.contrib import admin
+from django.urls import reverse
+from django.utils.html import format_html
+
+from .models import Profile, SlowQuery
+
+
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'sql',
+        'view',
+        'count',
+        'max_duration',
+        'last_seen',
+    )
+    search_fields = ('sql',)
+    list_filter = ('view', 'last_seen')
+    readonly_fields = (
+        'sql',
+        'view',
+        'plan',
+        'count',
+        'total_duration',
+        'max_duration',
+        'last_seen',
+    )
+    empty_value_display = '-пусто-'
+
+    def has_add_permission(self, request):
+        return False
+
+
+class ProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'created',
+        'method',
+        'path',
+        'view',
+        'status',
+        'mode',
+        'duration',
+        'user',
+        'download',
+    )
+    search_fields = ('path',)
+    list_filter = ('view', 'mode', 'created')
+    readonly_fields = (
+        'created',
+        'user',
+        'method',
+        'path',
+        'view',
+        'status',
+        'mode',
+        'duration',
+        'samples',
+        'file',
+        'download',
+    )
+    empty_value_display = '-пусто-'
+
+    def has_add_permission(self, request):
+        return False
+
+    def download(self, obj):
+        return format_html(
+            '<a href="{}">{}</a>',
+            reverse('profile_download', args=[obj.pk]),
+            obj.file,
+        )
+    download.short_description = 'Скачать'
+
+
+admin.site.register(SlowQuery, SlowQueryAdmin)
+admin.site.register(Profile, ProfileAdmin)
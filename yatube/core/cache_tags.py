@@ -0,0 +1,35 @@
+"""Инвалидация кеша по тегам.
+
+У каждого тега (`posts`, `author:1`, `group:2`, `post:3`, `follow:4`)
+в кеше хранится версия. Ключ закешированного значения включает версии
+тегов, от которых оно зависит, поэтому сброс тега — это запись новой
+версии: старые ключи больше не собираются и сами уходят по таймауту,
+а остальной кеш не трогается.
+"""
+import time
+
+from django.core.cache import cache
+
+TAG_KEY_PREFIX = 'tag:'
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def tag_versions(*tags) -> str:
+    """Строка из текущих версий тегов для включения в ключ кеша."""
+    keys = [f'{TAG_KEY_PREFIX}{tag}' for tag in tags]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def invalidate_tags(*tags):
+    """Сбрасывает все значения, закешированные с этими тегами."""
+    version = _new_version()
+    cache.set_many(
+        {f'{TAG_KEY_PREFIX}{tag}': version for tag in set(tags)}, None)
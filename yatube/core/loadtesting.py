@@ -0,0 +1,130 @@
+"""Общие части нагрузочных команд loadtest и replay_log.
+
+Локальный сервер yatube.wsgi в отдельном процессе, HTTP-клиент
+с cookie одного пользователя и сводка замеров по адресу.
+"""
+import multiprocessing
+import time
+from http.cookiejar import CookieJar
+from socketserver import ThreadingMixIn
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request
+from urllib.request import build_opener
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.conf import settings
+from django.db import connections
+from django.urls import reverse
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(port_queue):
+    """Отдает yatube.wsgi в потоках, пока процесс не завершат."""
+    from yatube.wsgi import application
+
+    server = make_server(
+        '127.0.0.1', 0, application,
+        server_class=ThreadingWSGIServer,
+        handler_class=QuietHandler,
+    )
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def start_server():
+    """Запускает приложение на свободном порту; возвращает процесс
+    и адрес. Клиенты в потоках не делят GIL с сервером."""
+    # Процесс сервера не должен наследовать соединения с базой.
+    connections.close_all()
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=_serve, args=(port_queue,), daemon=True)
+    server.start()
+    port = port_queue.get(timeout=60)
+    return server, f'http://127.0.0.1:{port}'
+
+
+class NoRedirect(HTTPRedirectHandler):
+    """Редирект — это ответ view, а не повод для второго запроса."""
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Session:
+    """Клиент одного виртуального пользователя со своими cookie."""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.authorized = False
+        self.cookies = CookieJar()
+        self.opener = build_opener(
+            HTTPCookieProcessor(self.cookies), NoRedirect)
+
+    @property
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == settings.CSRF_COOKIE_NAME:
+                return cookie.value
+        return ''
+
+    def request(self, path, data=None, method=None):
+        """Возвращает код ответа; 3xx считается успешным ответом."""
+        if data is not None:
+            data = urlencode(
+                {**data, 'csrfmiddlewaretoken': self.csrf_token}).encode()
+        request = Request(self.base_url + path, data, method=method)
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except HTTPError as error:
+            return error.code
+
+    def timed(self, path, data=None, method=None):
+        """Время ответа и код; код None — соединение не удалось."""
+        start = time.perf_counter()
+        try:
+            status = self.request(path, data, method)
+        except (URLError, OSError):
+            status = None
+        return time.perf_counter() - start, status
+
+    def login(self, username, password):
+        path = reverse('users:login')
+        self.request(path)
+        status = self.request(
+            path, {'username': username, 'password': password})
+        self.authorized = status == 302
+        return self.authorized
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = round(percent / 100 * (len(values) - 1))
+    return values[index]
+
+
+def summarize(samples, elapsed):
+    """Сводка замеров [(время, код), ...] одного адреса, время в мс."""
+    timings = [timing * 1000 for timing, _ in samples]
+    errors = sum(
+        1 for _, status in samples if status is None or status >= 400)
+    return {
+        'requests': len(samples),
+        'rps': len(samples) / elapsed,
+        'p50': percentile(timings, 50),
+        'p95': percentile(timings, 95),
+        'p99': percentile(timings, 99),
+        'max': max(timings),
+        'error_rate': errors / len(samples),
+    }
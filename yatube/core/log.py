@@ -0,0 +1,16 @@
+"""Обработчики логов проекта."""
+import os
+from logging.handlers import RotatingFileHandler
+
+
+class LazyRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler, который создает каталог и файл лога только
+    при первой записи, а не при настройке логирования."""
+
+    def __init__(self, filename, **kwargs):
+        kwargs['delay'] = True
+        super().__init__(filename, **kwargs)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
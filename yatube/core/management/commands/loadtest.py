@@ -0,0 +1,235 @@
+"""Нагрузочный прогон ленты на локально поднятом приложении.
+
+Команда запускает yatube.wsgi в отдельном процессе на свободном порту
+(или бьет в уже запущенный экземпляр по --url) и гоняет смесь запросов
+анонимов и вошедших пользователей в N потоков. В конце печатает по
+каждому адресу RPS, p50/p95/p99 и долю ошибок; --json сохраняет то же
+для сравнения прогонов.
+
+Адреса строятся по данным локальной базы, поэтому внешний экземпляр
+должен работать с той же базой. Пароль пользователей — тот, что задан
+в generate_data.
+"""
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from core.loadtesting import Session, start_server, summarize
+from posts.models import Group, Post, User
+
+# Доли адресов в смеси по умолчанию.
+DEFAULT_MIX = {
+    'index': 30,
+    'group_posts': 15,
+    'profile': 15,
+    'post_detail': 25,
+    'follow_index': 10,
+    'add_comment': 5,
+}
+# Эти адреса запрашивают только вошедшие пользователи.
+LOGIN_REQUIRED = {'follow_index', 'add_comment'}
+# Сколько объектов каждого вида брать из базы для адресов.
+SAMPLE_SIZE = 1000
+
+
+def _parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in DEFAULT_MIX or not weight.isdigit():
+            raise CommandError(
+                f'Неверная смесь «{part}»: ожидается адрес=вес, адреса: '
+                + ', '.join(DEFAULT_MIX)
+            )
+        mix[name] = int(weight)
+    return mix
+
+
+def _replay_mix(session, targets, mix, deadline, rng):
+    """Запросы по смеси до deadline: {адрес: [(время, код), ...]}."""
+    mix = {
+        endpoint: weight for endpoint, weight in mix.items()
+        if session.authorized or endpoint not in LOGIN_REQUIRED
+    }
+    samples = defaultdict(list)
+    if not mix:
+        return samples
+    endpoints, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        endpoint = rng.choices(endpoints, weights)[0]
+        data = ({'text': 'Комментарий нагрузочного теста'}
+                if endpoint == 'add_comment' else None)
+        samples[endpoint].append(
+            session.timed(targets.path(endpoint, rng), data))
+    return samples
+
+
+class Targets:
+    """Случайные группы, авторы, посты и читатели из базы."""
+
+    def __init__(self):
+        self.groups = self.sample(Group.objects.values_list('slug'))
+        self.authors = self.sample(
+            User.objects.filter(posts__isnull=False)
+            .distinct().values_list('username'))
+        self.posts = self.sample(Post.objects.values_list('pk'))
+        self.readers = self.sample(
+            User.objects.filter(follower__isnull=False)
+            .distinct().values_list('username'))
+        if not (self.groups and self.authors and self.posts):
+            raise CommandError(
+                'В базе нет групп или постов: сначала generate_data.')
+
+    def sample(self, queryset):
+        return [row[0] for row in queryset.order_by('?')[:SAMPLE_SIZE]]
+
+    def path(self, endpoint, rng):
+        if endpoint == 'index':
+            return reverse('posts:main-view')
+        if endpoint == 'group_posts':
+            return reverse(
+                'posts:group_posts', args=[rng.choice(self.groups)])
+        if endpoint == 'profile':
+            return reverse('posts:profile', args=[rng.choice(self.authors)])
+        if endpoint == 'follow_index':
+            return reverse('posts:follow_index')
+        view = ('posts:add_comment' if endpoint == 'add_comment'
+                else 'posts:post_detail')
+        return reverse(view, args=[rng.choice(self.posts)])
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон основных страниц: RPS, перцентили '
+            'времени ответа и доля ошибок по каждому адресу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=30,
+            help='Длительность прогона в секундах.'
+        )
+        parser.add_argument(
+            '--mix',
+            type=_parse_mix,
+            default=DEFAULT_MIX,
+            help='Веса адресов, например index=50,post_detail=50.'
+        )
+        parser.add_argument(
+            '--logged-in',
+            type=float,
+            default=0.5,
+            help='Доля потоков, которые входят на сайт.'
+        )
+        parser.add_argument('--password', default='password')
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного экземпляра; без него приложение '
+                 'поднимается локально.'
+        )
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--json', help='Куда сохранить результаты.')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        targets = Targets()
+        workers = options['workers']
+        logged_in = round(workers * options['logged_in'])
+        if logged_in and not targets.readers:
+            raise CommandError('В базе нет пользователей с подписками.')
+
+        if settings.DEBUG:
+            self.stderr.write(
+                'DEBUG включен: debug_toolbar и запись SQL-запросов '
+                'искажают замеры.'
+            )
+        server = None
+        base_url = options['url']
+        if base_url is None:
+            server, base_url = start_server()
+            self.stdout.write(f'приложение запущено на {base_url}')
+        try:
+            results, elapsed = self.run(
+                targets, base_url, workers, logged_in, options)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.join()
+
+        report = self.report(results, elapsed)
+        if options['json']:
+            with open(options['json'], 'w') as report_file:
+                json.dump(report, report_file, indent=2, sort_keys=True)
+
+    def run(self, targets, base_url, workers, logged_in, options):
+        rng = random.Random(options['seed'])
+        sessions = [
+            self.open_session(
+                targets, base_url, number if number < logged_in else None,
+                options)
+            for number in range(workers)
+        ]
+        results = defaultdict(list)
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def work(session, seed):
+            samples = _replay_mix(
+                session, targets, options['mix'], deadline,
+                random.Random(seed))
+            with lock:
+                for endpoint, values in samples.items():
+                    results[endpoint].extend(values)
+
+        threads = [
+            threading.Thread(target=work, args=(session, rng.random()))
+            for session in sessions
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.monotonic() - started
+
+    def open_session(self, targets, base_url, reader, options):
+        """Сессия анонима или, если задан номер reader, читателя."""
+        session = Session(base_url, options['timeout'])
+        if reader is None:
+            return session
+        username = targets.readers[reader % len(targets.readers)]
+        if not session.login(username, options['password']):
+            raise CommandError(
+                f'Не удалось войти как {username}: проверьте --password.')
+        return session
+
+    def report(self, results, elapsed):
+        report = {}
+        self.stdout.write(
+            f'{"адрес":<14}{"запросы":>9}{"RPS":>9}'
+            f'{"p50, мс":>10}{"p95, мс":>10}{"p99, мс":>10}{"ошибки":>9}'
+        )
+        for endpoint in DEFAULT_MIX:
+            samples = results.get(endpoint)
+            if not samples:
+                continue
+            row = summarize(samples, elapsed)
+            report[endpoint] = row
+            self.stdout.write(
+                f'{endpoint:<14}{row["requests"]:>9}{row["rps"]:>9.1f}'
+                f'{row["p50"]:>10.1f}{row["p95"]:>10.1f}{row["p99"]:>10.1f}'
+                f'{row["error_rate"]:>9.1%}'
+            )
+        total = sum(row['requests'] for row in report.values())
+        self.stdout.write(
+            f'всего {total} запросов за {elapsed:.1f} с, '
+            f'{total / elapsed:.1f} RPS'
+        )
+        return report
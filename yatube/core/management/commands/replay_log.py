@@ -0,0 +1,277 @@
+"""Воспроизведение access-лога на локальном экземпляре.
+
+Команда читает лог в формате combined (nginx, Apache), сопоставляет
+запросы с маршрутами проекта и повторяет GET- и HEAD-запросы тем же
+методом с исходными интервалами, сжатыми в --speed раз (0 — без пауз).
+
+Замеры группируются по маршруту, а у маршрутов с параметрами (пост,
+автор, сообщество) — еще и по адресу, так что всплеск на одном посте
+виден отдельной строкой. Номер ?page= попадает в группу диапазоном
+(2-9, 10-99, ...), поэтому обход глубоких страниц не смешивается
+с первой страницей. Печатаются --top самых частых групп, --json
+сохраняет все; --compare сравнивает два сохраненных прогона.
+
+Запросы повторяются анонимно: сессий пользователей в логе нет.
+"""
+import json
+import queue
+import re
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import Resolver404, resolve
+
+from core.loadtesting import Session, percentile, start_server, summarize
+
+LOG_LINE = re.compile(
+    r'\S+ \S+ \S+ \[(?P<time>[^\]]+)\] '
+    r'"(?P<method>[A-Z]+) (?P<target>\S+)[^"]*" \d{3} \S+'
+)
+LOG_TIME = '%d/%b/%Y:%H:%M:%S %z'
+REPLAYABLE_METHODS = {'GET', 'HEAD'}
+# Показатели, по которым сравниваются прогоны.
+COMPARED = ('p50', 'p95', 'p99', 'error_rate')
+
+LogRequest = namedtuple('LogRequest', 'offset method target group')
+
+
+def page_bucket(query):
+    """Диапазон номера страницы из ?page=: None для первой страницы."""
+    params = parse_qs(query)
+    if 'after' in params or 'before' in params:
+        return 'cursor'
+    page = params.get('page', [''])[0]
+    if not page.isdigit() or int(page) <= 1:
+        return None
+    digits = len(page.lstrip('0'))
+    low = 10 ** (digits - 1) if digits > 1 else 2
+    return f'page={low}-{10 ** digits - 1}'
+
+
+def group_of(target):
+    """Группа замеров запроса или None, если маршрута нет."""
+    url = urlsplit(target)
+    match = resolve(url.path)
+    group = match.view_name
+    if match.kwargs:
+        group += f' {url.path}'
+    bucket = page_bucket(url.query)
+    if bucket:
+        group += f' ?{bucket}'
+    return group
+
+
+def parse_log(lines):
+    """Запросы лога со смещением от первого и счетчик пропущенных строк."""
+    requests = []
+    skipped = Counter()
+    for line in lines:
+        match = LOG_LINE.match(line)
+        if match is None:
+            skipped['не разобрано'] += 1
+            continue
+        if match['method'] not in REPLAYABLE_METHODS:
+            skipped[f'метод {match["method"]}'] += 1
+            continue
+        target = match['target']
+        try:
+            group = group_of(target)
+        except Resolver404:
+            skipped['нет маршрута'] += 1
+            continue
+        moment = datetime.strptime(match['time'], LOG_TIME).timestamp()
+        requests.append(LogRequest(moment, match['method'], target, group))
+
+    requests.sort(key=lambda request: request.offset)
+    if requests:
+        first = requests[0].offset
+        requests = [
+            request._replace(offset=request.offset - first)
+            for request in requests
+        ]
+    return requests, skipped
+
+
+def replay(requests, base_url, workers, speed, timeout):
+    """Повторяет запросы по расписанию; возвращает замеры по группам,
+    опоздания запуска относительно расписания и длительность прогона."""
+    pending = queue.Queue(maxsize=workers * 2)
+    results = defaultdict(list)
+    lags = []
+    lock = threading.Lock()
+
+    def work():
+        session = Session(base_url, timeout)
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            request, due = item
+            lag = max(time.monotonic() - due, 0)
+            sample = session.timed(request.target, method=request.method)
+            with lock:
+                results[request.group].append(sample)
+                lags.append(lag)
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    started = time.monotonic()
+    for request in requests:
+        due = started + (request.offset / speed if speed else 0)
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        pending.put((request, due))
+    for _ in threads:
+        pending.put(None)
+    for thread in threads:
+        thread.join()
+    return results, lags, time.monotonic() - started
+
+
+class Command(BaseCommand):
+    help = ('Повторяет запросы из access-лога и сравнивает '
+            'распределения времени ответа двух прогонов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('log', nargs='?', help='Файл access-лога.')
+        parser.add_argument(
+            '--speed',
+            type=float,
+            default=1,
+            help='Во сколько раз сжать время лога; 0 — без пауз.'
+        )
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Сколько первых запросов лога повторить.'
+        )
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного экземпляра; без него приложение '
+                 'поднимается локально.'
+        )
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=30,
+            help='Сколько самых частых групп напечатать.'
+        )
+        parser.add_argument('--json', help='Куда сохранить прогон.')
+        parser.add_argument(
+            '--compare',
+            nargs=2,
+            metavar=('BASE', 'NEW'),
+            help='Сравнить два прогона, сохраненных через --json.'
+        )
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            self.compare(*options['compare'])
+            return
+        if not options['log']:
+            raise CommandError('Укажите файл лога или --compare.')
+        if options['speed'] < 0:
+            raise CommandError('--speed не может быть отрицательным.')
+
+        with open(options['log'], encoding='utf-8',
+                  errors='replace') as log_file:
+            requests, skipped = parse_log(log_file)
+        requests = requests[:options['limit']]
+        for reason, count in sorted(skipped.items()):
+            self.stdout.write(f'пропущено ({reason}): {count}')
+        if not requests:
+            raise CommandError('В логе нет запросов для повтора.')
+        if settings.DEBUG:
+            self.stderr.write(
+                'DEBUG включен: debug_toolbar и запись SQL-запросов '
+                'искажают замеры.'
+            )
+
+        server = None
+        base_url = options['url']
+        if base_url is None:
+            server, base_url = start_server()
+            self.stdout.write(f'приложение запущено на {base_url}')
+        try:
+            results, lags, elapsed = replay(
+                requests, base_url, options['workers'],
+                options['speed'], options['timeout'])
+        finally:
+            if server is not None:
+                server.terminate()
+                server.join()
+
+        run = {
+            'log': options['log'],
+            'speed': options['speed'],
+            'elapsed': elapsed,
+            'lag_p95': percentile(lags, 95) * 1000,
+            'groups': {
+                group: summarize(samples, elapsed)
+                for group, samples in results.items()
+            },
+        }
+        self.report(run, options['top'])
+        if options['json']:
+            with open(options['json'], 'w') as run_file:
+                json.dump(run, run_file, indent=2, sort_keys=True)
+
+    def report(self, run, top):
+        self.stdout.write(
+            f'{"группа":<50}{"запросы":>9}{"p50, мс":>10}'
+            f'{"p95, мс":>10}{"p99, мс":>10}{"ошибки":>9}'
+        )
+        groups = sorted(
+            run['groups'].items(), key=lambda item: -item[1]['requests'])
+        for group, row in groups[:top]:
+            self.stdout.write(
+                f'{group:<50}{row["requests"]:>9}{row["p50"]:>10.1f}'
+                f'{row["p95"]:>10.1f}{row["p99"]:>10.1f}'
+                f'{row["error_rate"]:>9.1%}'
+            )
+        if len(groups) > top:
+            self.stdout.write(f'еще групп: {len(groups) - top} (см. --json)')
+        # Если сервер не успевает, запросы уходят позже расписания
+        # и прогон перестает повторять исходную нагрузку.
+        self.stdout.write(
+            f'прогон {run["elapsed"]:.1f} с, опоздание запуска '
+            f'p95 {run["lag_p95"]:.1f} мс'
+        )
+
+    def compare(self, base_path, new_path):
+        with open(base_path) as base_file, open(new_path) as new_file:
+            base, new = json.load(base_file), json.load(new_file)
+        self.stdout.write(
+            f'{"группа":<50}{"показатель":>12}{"было":>10}'
+            f'{"стало":>10}{"изменение":>11}'
+        )
+        for group in sorted(set(base['groups']) | set(new['groups'])):
+            before = base['groups'].get(group)
+            after = new['groups'].get(group)
+            if before is None or after is None:
+                self.stdout.write(
+                    f'{group:<50} есть только в '
+                    f'{"новом" if before is None else "базовом"} прогоне'
+                )
+                continue
+            for metric in COMPARED:
+                old_value, new_value = before[metric], after[metric]
+                change = (
+                    f'{(new_value - old_value) / old_value:+.0%}'
+                    if old_value else '—'
+                )
+                spec = '.1%' if metric == 'error_rate' else '.1f'
+                self.stdout.write(
+                    f'{group:<50}{metric:>12}{old_value:>10{spec}}'
+                    f'{new_value:>10{spec}}{change:>11}'
+                )
@@ -0,0 +1,124 @@
+"""Наблюдение за памятью воркера: снимки tracemalloc и пики запросов.
+
+Страница memory/ (только сотрудники) включает и выключает tracemalloc,
+снимает снимки и показывает разницу двух снимков по строкам кода.
+Снимки хранятся в памяти процесса, поэтому при нескольких воркерах
+страница показывает тот воркер, который принял запрос.
+
+Разницу до и после одного запроса дает профилирование с режимом
+`memory` (core.profiling). MemoryPeakMiddleware пишет в лог
+yatube.memory рост RSS за запросы к маршрутам MEMORY_PEAK_VIEWS,
+а при включенном tracemalloc — еще и пик выделенной памяти.
+"""
+import itertools
+import os
+import threading
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils import timezone
+
+Snapshot = namedtuple('Snapshot', 'id taken snapshot')
+
+# Служебные выделения самого tracemalloc и импорта не показываются.
+_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+_snapshots = []
+_ids = itertools.count(1)
+_lock = threading.Lock()
+
+
+def rss():
+    """Резидентная память процесса в байтах или None, если /proc нет."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+
+
+def start():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(settings.MEMORY_TRACE_FRAMES)
+
+
+def stop():
+    """Выключает tracemalloc; снимки без трассировки не нужны."""
+    tracemalloc.stop()
+    with _lock:
+        _snapshots.clear()
+
+
+def reset_peak():
+    """Сбрасывает пик выделенной памяти tracemalloc до текущего уровня.
+
+    tracemalloc.reset_peak есть только с Python 3.9. Раньше пик
+    сбрасывается только вместе со следами, а перезапуск трассировки
+    стер бы снимки и следы параллельных запросов, поэтому тогда пик
+    не сбрасывается и функция возвращает False.
+    """
+    if not hasattr(tracemalloc, 'reset_peak'):
+        return False
+    tracemalloc.reset_peak()
+    return True
+
+
+def take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(_FILTERS)
+
+
+def snapshot():
+    """Снимок в список процесса; старые сверх MEMORY_SNAPSHOTS_KEPT
+    удаляются."""
+    saved = Snapshot(next(_ids), timezone.now(), take_snapshot())
+    with _lock:
+        _snapshots.append(saved)
+        del _snapshots[:-settings.MEMORY_SNAPSHOTS_KEPT]
+    return saved
+
+
+def snapshots():
+    with _lock:
+        return list(_snapshots)
+
+
+def get_snapshot(snapshot_id):
+    return next(
+        (saved for saved in snapshots() if saved.id == snapshot_id), None)
+
+
+def top_lines(new, old=None):
+    """Места с наибольшим выделением памяти (или ростом, если
+    дан предыдущий снимок) по строкам кода."""
+    if old is None:
+        stats = new.statistics('lineno')
+    else:
+        stats = new.compare_to(old, 'lineno')
+    return [str(stat) for stat in stats[:settings.MEMORY_TOP_STATS]]
+
+
+@contextmanager
+def traced():
+    """Включает tracemalloc на время блока, если он выключен.
+
+    Возвращает True, если трассировка включена этим блоком.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        start()
+    try:
+        yield started
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+def format_size(size):
+    return f'{size / 1024:.1f} KiB' if size is not None else '—'
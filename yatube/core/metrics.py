@@ -0,0 +1,292 @@
+"""Метрики процессов приложения в текстовом формате Prometheus.
+
+Каждый процесс пишет свои значения в собственный файл
+settings.METRICS_DIR/metrics_<pid>.db через mmap, без блокировок между
+процессами. Страница метрик читает все файлы каталога и складывает
+одинаковые ряды, поэтому цифры сходятся при любом числе воркеров.
+Процесс при первой записи удаляет файлы завершенных процессов: их
+счетчики уходят из суммы, и Prometheus видит это как сброс счетчика.
+
+Формат файла: 8 байт — занятая длина, затем записи
+[длина ключа: 4 байта][ключ JSON, выровненный до 8][значение: double].
+"""
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.template import NodeList
+from django.templatetags.cache import CacheNode
+
+from . import request_stats
+
+INITIAL_SIZE = 64 * 1024
+_HEADER = struct.Struct('q')
+_KEY_LENGTH = struct.Struct('i')
+_VALUE = struct.Struct('d')
+
+# Границы корзин гистограммы времени ответа, в секундах.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+# Описание рядов: тип и подсказка для # TYPE / # HELP.
+METRICS = {
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа по маршрутам.'),
+    'yatube_db_queries_total': (
+        'counter', 'Запросы к базе по маршрутам.'),
+    'yatube_fragment_cache_hits_total': (
+        'counter', 'Попадания в кеш фрагментов шаблонов.'),
+    'yatube_fragment_cache_misses_total': (
+        'counter', 'Промахи кеша фрагментов шаблонов.'),
+    'yatube_thumbnails_generated_total': (
+        'counter', 'Созданные миниатюры картинок.'),
+    'yatube_template_renders_total': (
+        'counter', 'Рендеры шаблонов, включая include.'),
+    'yatube_template_render_seconds_total': (
+        'counter', 'Время рендера шаблонов вместе с вложенными.'),
+    'yatube_template_tag_calls_total': (
+        'counter', 'Вызовы замеряемых тегов и фильтров.'),
+    'yatube_template_tag_seconds_total': (
+        'counter', 'Время замеряемых тегов и фильтров.'),
+}
+
+
+class MmapFile:
+    """Значения одного процесса в файле; пишет только этот процесс."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._positions = {}
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size < INITIAL_SIZE:
+            self._file.truncate(INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        for key, _, position in _read_entries(self._map, self._used):
+            self._positions[key] = position
+
+    def add(self, key, amount):
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._append(key)
+            value = _VALUE.unpack_from(self._map, position)[0]
+            _VALUE.pack_into(self._map, position, value + amount)
+
+    def _append(self, key):
+        encoded = key.encode()
+        padded = len(encoded) + (-(_KEY_LENGTH.size + len(encoded)) % 8)
+        size = _KEY_LENGTH.size + padded + _VALUE.size
+        while self._used + size > len(self._map):
+            self._grow()
+        _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        start = self._used + _KEY_LENGTH.size
+        self._map[start:start + len(encoded)] = encoded
+        position = start + padded
+        _VALUE.pack_into(self._map, position, 0.0)
+        self._used += size
+        # Длина пишется последней: читатель не увидит запись без значения.
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def _grow(self):
+        size = len(self._map) * 2
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+
+def _read_entries(data, used):
+    position = _HEADER.size
+    while position < used:
+        length = _KEY_LENGTH.unpack_from(data, position)[0]
+        start = position + _KEY_LENGTH.size
+        key = bytes(data[start:start + length]).decode()
+        value_position = start + length + (
+            -(_KEY_LENGTH.size + length) % 8)
+        value = _VALUE.unpack_from(data, value_position)[0]
+        yield key, value, value_position
+        position = value_position + _VALUE.size
+
+
+_files = {}
+_files_lock = threading.Lock()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _remove_stale_files(directory):
+    """Удаляет файлы метрик процессов, которых больше нет."""
+    for path in glob.glob(os.path.join(directory, 'metrics_*.db')):
+        pid = os.path.basename(path)[len('metrics_'):-len('.db')]
+        if pid.isdigit() and not _alive(int(pid)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Файл уже удалил другой процесс.
+                pass
+
+
+def _current_file():
+    # Ключ включает pid: после fork воркер открывает свой файл.
+    key = (os.getpid(), settings.METRICS_DIR)
+    values = _files.get(key)
+    if values is None:
+        with _files_lock:
+            values = _files.get(key)
+            if values is None:
+                os.makedirs(settings.METRICS_DIR, exist_ok=True)
+                _remove_stale_files(settings.METRICS_DIR)
+                values = _files[key] = MmapFile(os.path.join(
+                    settings.METRICS_DIR, f'metrics_{os.getpid()}.db'))
+    return values
+
+
+def _key(name, labels):
+    return json.dumps([name, sorted(labels.items())], ensure_ascii=False)
+
+
+def inc(name, amount=1, **labels):
+    _current_file().add(_key(name, labels), amount)
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """Наблюдение гистограммы: корзина, сумма и число наблюдений."""
+    values = _current_file()
+    # Корзины накопительные, как в Prometheus: le=X включает все
+    # меньшие. Пустые тоже записываются — нужен полный набор.
+    for bound in buckets:
+        values.add(
+            _key(f'{name}_bucket', {**labels, 'le': bound}),
+            1 if value <= bound else 0,
+        )
+    values.add(_key(f'{name}_sum', labels), value)
+    values.add(_key(f'{name}_count', labels), 1)
+
+
+def view_label():
+    """Имя маршрута текущего запроса; вне запроса — 'background'."""
+    stats = request_stats.current()
+    if stats is None:
+        return 'background'
+    return stats.view_name or '<unresolved>'
+
+
+def record_request(stats, duration):
+    """Показатели завершенного запроса, вызывает ServerTimingMiddleware."""
+    view = stats.view_name or '<unresolved>'
+    observe('yatube_request_duration_seconds', duration, view=view)
+    inc('yatube_db_queries_total', stats.db_queries, view=view)
+    for template, (calls, seconds) in stats.templates.items():
+        inc('yatube_template_renders_total', calls,
+            view=view, template=template)
+        inc('yatube_template_render_seconds_total', seconds,
+            view=view, template=template)
+    for tag, (calls, seconds) in stats.tags.items():
+        inc('yatube_template_tag_calls_total', calls, view=view, tag=tag)
+        inc('yatube_template_tag_seconds_total', seconds, view=view, tag=tag)
+
+
+# Список, в который отмечается рендер содержимого {% cache %},
+# то есть промах кеша фрагмента.
+_fragment_misses = ContextVar('fragment_misses', default=None)
+
+
+class _MissTrackingNodeList(NodeList):
+    def render(self, context):
+        misses = _fragment_misses.get()
+        if misses is not None:
+            misses.append(True)
+        return super().render(context)
+
+
+def _counted_fragment(render):
+    @wraps(render)
+    def wrapper(self, context):
+        if not isinstance(self.nodelist, _MissTrackingNodeList):
+            self.nodelist = _MissTrackingNodeList(self.nodelist)
+        misses = []
+        token = _fragment_misses.set(misses)
+        try:
+            value = render(self, context)
+        finally:
+            _fragment_misses.reset(token)
+        name = 'misses' if misses else 'hits'
+        inc(f'yatube_fragment_cache_{name}_total',
+            view=view_label(), fragment=self.fragment_name)
+        return value
+    return wrapper
+
+
+def install():
+    """Ставит счетчик кеша фрагментов; повторный вызов безопасен."""
+    request_stats.patch(CacheNode, 'render', _counted_fragment)
+
+
+def collect():
+    """Сумма рядов из файлов всех процессов: {(имя, метки): значение}."""
+    totals = defaultdict(float)
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.db')):
+        with open(path, 'rb') as metrics_file:
+            data = metrics_file.read()
+        if len(data) < _HEADER.size:
+            continue
+        used = _HEADER.unpack_from(data, 0)[0]
+        for key, value, _ in _read_entries(data, used):
+            name, labels = json.loads(key)
+            totals[name, tuple(map(tuple, labels))] += value
+    return totals
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        f'{name}="{_format_bound(value)}"' for name, value in labels)
+    return f'{{{pairs}}}'
+
+
+def _format_bound(value):
+    if value == float('inf'):
+        return '+Inf'
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _base_name(name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+            return name[:-len(suffix)]
+    return name
+
+
+def render():
+    """Все ряды в текстовом формате Prometheus."""
+    series = collect()
+    families = defaultdict(list)
+    for (name, labels), value in series.items():
+        families[_base_name(name)].append((name, labels, value))
+
+    lines = []
+    for family in sorted(families):
+        kind, help_text = METRICS.get(family, ('untyped', ''))
+        lines.append(f'# HELP {family} {help_text}')
+        lines.append(f'# TYPE {family} {kind}')
+        for name, labels, value in sorted(families[family]):
+            lines.append(f'{name}{_format_labels(labels)} {value:g}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,175 @@
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import memory, metrics, nplusone, profiling, request_stats
+
+logger = logging.getLogger('yatube.requests')
+nplusone_logger = logging.getLogger('yatube.nplusone')
+memory_logger = logging.getLogger('yatube.memory')
+
+
+class ServerTimingMiddleware:
+    """Время запроса по частям в заголовке Server-Timing и в логе.
+
+    Стоит первым в MIDDLEWARE, чтобы `total` покрывал остальные
+    middleware. `view` — время от вызова view до готового ответа.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        request_stats.install()
+        metrics.install()
+
+    def __call__(self, request):
+        stats = request_stats.RequestStats()
+        token = request_stats.activate(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.db_wrapper))
+                response = self.get_response(request)
+        finally:
+            request_stats.deactivate(token)
+        total = time.perf_counter() - start
+        view_start = getattr(request, '_view_start', None)
+        view = (time.perf_counter() - view_start
+                if view_start is not None else None)
+
+        response['Server-Timing'] = self.header(stats, total, view)
+        metrics.record_request(stats, total)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'view_ms': round(view * 1000, 2) if view is not None else None,
+            'db_ms': round(stats.db_time * 1000, 2),
+            'db_queries': stats.db_queries,
+            'template_ms': round(stats.template_time * 1000, 2),
+            'cache_hits': stats.cache_hits,
+            'cache_misses': stats.cache_misses,
+            'templates': self.timings(stats.templates),
+            'tags': self.timings(stats.tags),
+        }))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_start = time.perf_counter()
+        stats = request_stats.current()
+        if stats is not None:
+            stats.view_name = request.resolver_match.view_name
+
+    @staticmethod
+    def timings(timings):
+        return {
+            name: {'calls': calls, 'ms': round(duration * 1000, 2)}
+            for name, (calls, duration) in timings.items()
+        }
+
+    def header(self, stats, total, view):
+        metrics = [
+            f'db;dur={stats.db_time * 1000:.2f};'
+            f'desc="{stats.db_queries} queries"',
+            f'tpl;dur={stats.template_time * 1000:.2f}',
+            f'cache;desc="{stats.cache_hits} hits '
+            f'{stats.cache_misses} misses"',
+        ]
+        if view is not None:
+            metrics.append(f'view;dur={view * 1000:.2f}')
+        metrics.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(metrics)
+
+
+class NPlusOneMiddleware:
+    """Находки N+1 (core.nplusone) по каждому запросу — в лог,
+    а при NPLUSONE_STRICT — исключением.
+
+    Работает при NPLUSONE_DETECTION или внутри внешней области
+    наблюдения, например теста под плагином pytest.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.NPLUSONE_DETECTION and nplusone.current() is None:
+            return self.get_response(request)
+        with nplusone.detect(f'{request.method} {request.path}') as findings:
+            response = self.get_response(request)
+        for finding in findings:
+            nplusone_logger.warning(str(finding))
+        if findings and settings.NPLUSONE_STRICT:
+            raise nplusone.NPlusOneError(findings)
+        return response
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос сотрудника с токеном (core.profiling).
+
+    Стоит после AuthenticationMiddleware: токен сверяется с request.user.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = profiling.requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        return profiling.profile(request, self.get_response, mode)
+
+
+class MemoryPeakMiddleware:
+    """Память запросов к маршрутам MEMORY_PEAK_VIEWS — в лог yatube.memory.
+
+    Рост RSS пишется всегда, пик выделенной памяти — при включенном
+    tracemalloc (страница memory/). Пик общий для процесса: при
+    параллельных запросах в нем есть и чужие выделения. До Python 3.9
+    пик не сбросить, не стерев следы (memory.reset_peak), и он
+    не пишется.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        start = getattr(request, '_memory_start', None)
+        if start is not None:
+            self.log(request, response, *start)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.resolver_match.view_name not in settings.MEMORY_PEAK_VIEWS:
+            return
+        traced = None
+        if tracemalloc.is_tracing() and memory.reset_peak():
+            traced, _ = tracemalloc.get_traced_memory()
+        request._memory_start = (memory.rss(), traced)
+
+    def log(self, request, response, rss_start, traced_start):
+        rss = memory.rss()
+        line = {
+            'method': request.method,
+            'path': request.path,
+            'view': request.resolver_match.view_name,
+            'status': response.status_code,
+            'rss_kb': rss // 1024 if rss is not None else None,
+            'rss_growth_kb': (
+                (rss - rss_start) // 1024
+                if None not in (rss, rss_start) else None
+            ),
+            'traced_peak_kb': None,
+        }
+        if traced_start is not None and tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            line['traced_peak_kb'] = (peak - traced_start) // 1024
+        memory_logger.info(json.dumps(line))
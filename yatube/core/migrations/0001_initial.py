@@ -0,0 +1,32 @@
+# Generated by Django 2.2.19 on 2026-10-18 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sql', models.TextField(verbose_name='Нормализованный SQL')),
+                ('view', models.CharField(max_length=200, verbose_name='Маршрут')),
+                ('plan', models.TextField(blank=True, verbose_name='План запроса')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('total_duration', models.FloatField(default=0, verbose_name='Общее время, мс')),
+                ('max_duration', models.FloatField(default=0, verbose_name='Наибольшее время, мс')),
+                ('last_seen', models.DateTimeField(verbose_name='Последний раз')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'ordering': ('-last_seen',),
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-18 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_profile'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='mode',
+            field=models.CharField(choices=[('sample', 'Выборочный (folded stacks)'), ('cprofile', 'cProfile (pstats)'), ('memory', 'Память (tracemalloc)')], max_length=10, verbose_name='Профилировщик'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+User = get_user_model()
+
+
+# Медленный запрос к базе (core.slow_queries): одинаковые после
+# нормализации запросы одного маршрута собираются в одну запись.
+class SlowQuery(models.Model):
+    sql = models.TextField(verbose_name='Нормализованный SQL')
+    view = models.CharField(verbose_name='Маршрут', max_length=200)
+    plan = models.TextField(verbose_name='План запроса', blank=True)
+    count = models.PositiveIntegerField(
+        verbose_name='Количество',
+        default=0
+    )
+    total_duration = models.FloatField(
+        verbose_name='Общее время, мс',
+        default=0
+    )
+    max_duration = models.FloatField(
+        verbose_name='Наибольшее время, мс',
+        default=0
+    )
+    last_seen = models.DateTimeField(verbose_name='Последний раз')
+
+    class Meta:
+        ordering = ('-last_seen',)
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+
+    def __str__(self):
+        return self.sql[:80]
+
+
+# Профиль одного запроса (core.profiling); сам профиль лежит в файле.
+class Profile(models.Model):
+    SAMPLE = 'sample'
+    CPROFILE = 'cprofile'
+    MEMORY = 'memory'
+    MODES = (
+        (SAMPLE, 'Выборочный (folded stacks)'),
+        (CPROFILE, 'cProfile (pstats)'),
+        (MEMORY, 'Память (tracemalloc)'),
+    )
+
+    created = models.DateTimeField(
+        verbose_name='Дата',
+        auto_now_add=True
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        verbose_name='Кто запустил'
+    )
+    method = models.CharField(verbose_name='Метод', max_length=10)
+    path = models.CharField(verbose_name='Адрес', max_length=500)
+    view = models.CharField(verbose_name='Маршрут', max_length=200)
+    status = models.PositiveSmallIntegerField(verbose_name='Код ответа')
+    mode = models.CharField(
+        verbose_name='Профилировщик',
+        max_length=10,
+        choices=MODES
+    )
+    duration = models.FloatField(verbose_name='Время, мс')
+    samples = models.PositiveIntegerField(
+        verbose_name='Выборок',
+        null=True,
+        blank=True
+    )
+    file = models.CharField(verbose_name='Файл', max_length=200)
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+
+    def __str__(self):
+        return f'{self.method} {self.path}'
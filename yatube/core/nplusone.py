@@ -0,0 +1,144 @@
+"""Поиск N+1: один и тот же запрос много раз за запрос к сайту.
+
+`detect()` открывает область наблюдения: SELECT-запросы нормализуются
+(core.slow_queries.normalize), и запрос, выполненный больше
+settings.NPLUSONE_THRESHOLD раз, становится находкой. Для находки
+сохраняется место первого лишнего выполнения: строки шаблонов
+(`includes/comment_list.html:6 {{ comment.author.username }}`)
+и строки кода проекта.
+
+Области вкладываются: NPlusOneMiddleware открывает свою на каждый
+запрос к сайту, плагин pytest (core.pytest_plugin) — на каждый тест,
+и находки внутренних областей передаются внешним.
+"""
+import os
+import sys
+import traceback
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Node
+
+from .slow_queries import normalize
+
+_current = ContextVar('nplusone', default=None)
+
+_RENDER_ANNOTATED = Node.render_annotated.__code__
+# Перехватчики запросов не показываются в стеке находки.
+_HIDDEN_FILES = {
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ('nplusone.py', 'slow_queries.py', 'middleware.py',
+                 'request_stats.py', 'metrics.py')
+}
+
+
+class NPlusOneError(Exception):
+    """Находки N+1 в строгом режиме."""
+
+    def __init__(self, findings):
+        self.findings = findings
+        super().__init__('\n\n'.join(map(str, findings)))
+
+
+class Finding:
+    def __init__(self, sql, stack):
+        self.sql = sql
+        self.stack = stack
+        self.count = 0
+        self.where = None
+
+    def __str__(self):
+        lines = [f'N+1: запрос выполнен {self.count} раз'
+                 f'{f" ({self.where})" if self.where else ""}:',
+                 f'  {self.sql}']
+        lines.extend(f'    {line}' for line in self.stack)
+        return '\n'.join(lines)
+
+
+def _template_lines(frame):
+    """Строки шаблонов в стеке, от внутреннего узла к внешнему."""
+    lines = []
+    while frame is not None:
+        if frame.f_code is _RENDER_ANNOTATED:
+            node = frame.f_locals['self']
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                lines.append(
+                    f'{origin.template_name or origin.name}:{token.lineno} '
+                    f'{token.contents}'
+                )
+        frame = frame.f_back
+    return lines
+
+
+def _project_lines(frame):
+    """Строки кода проекта (не библиотек), от внутренней к внешней."""
+    lines = []
+    for entry in reversed(traceback.extract_stack(frame)):
+        filename = os.path.abspath(entry.filename)
+        if (not filename.startswith(settings.BASE_DIR)
+                or filename in _HIDDEN_FILES
+                or f'{os.sep}site-packages{os.sep}' in filename):
+            continue
+        path = os.path.relpath(filename, settings.BASE_DIR)
+        lines.append(f'{path}:{entry.lineno} in {entry.name}')
+    return lines
+
+
+class Scope:
+    """Счетчики запросов одной области наблюдения."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = {}
+        self.found = {}
+        # Находки этой области и вложенных, заполняется при выходе.
+        self.findings = []
+
+    def wrapper(self, execute, sql, params, many, context):
+        if _current.get() is self and sql.lstrip()[:6].upper() == 'SELECT':
+            self.count(normalize(sql))
+        return execute(sql, params, many, context)
+
+    def count(self, sql):
+        self.counts[sql] = self.counts.get(sql, 0) + 1
+        if self.counts[sql] <= self.threshold:
+            return
+        finding = self.found.get(sql)
+        if finding is None:
+            frame = sys._getframe(1)
+            finding = self.found[sql] = Finding(
+                sql, _template_lines(frame) + _project_lines(frame))
+        finding.count = self.counts[sql]
+
+
+def current():
+    """Открытая область наблюдения или None."""
+    return _current.get()
+
+
+@contextmanager
+def detect(where=None, threshold=None):
+    """Считает запросы внутри блока; находки — в списке,
+    который возвращает `with`, и в списке внешней области."""
+    if threshold is None:
+        threshold = settings.NPLUSONE_THRESHOLD
+    scope = Scope(threshold)
+    parent = _current.get()
+    token = _current.set(scope)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(scope.wrapper))
+            yield scope.findings
+    finally:
+        _current.reset(token)
+        for finding in scope.found.values():
+            finding.where = where
+            scope.findings.append(finding)
+        if parent is not None:
+            parent.findings.extend(scope.findings)
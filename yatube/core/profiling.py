@@ -0,0 +1,170 @@
+"""Профилирование отдельных запросов по подписанному токену.
+
+Сотрудник получает токен на странице profiling/token/ и добавляет его
+к адресу (`?_profile=<токен>`) или в заголовок `X-Profile`. Токен
+подписан (django.core.signing), привязан к сотруднику и задает режим:
+
+* `sample` — выборочный профилировщик: отдельный поток каждые
+  PROFILING_INTERVAL секунд снимает стек потока запроса
+  (sys._current_frames) и пишет свернутые стеки (.folded) для
+  flamegraph.pl и speedscope;
+* `cprofile` — детерминированный cProfile, файл pstats (.prof) для
+  snakeviz и flameprof;
+* `memory` — снимки tracemalloc до и после запроса: пик и рост
+  выделенной памяти по строкам кода (.txt).
+
+Файлы лежат в PROFILING_DIR, список — в админке «Профили запросов».
+Без токена ProfilingMiddleware только проверяет его наличие.
+"""
+import cProfile
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from uuid import uuid4
+
+from django.conf import settings
+from django.core import signing
+
+from . import memory
+from .models import Profile
+
+SALT = 'core.profiling'
+QUERY_PARAMETER = '_profile'
+HEADER = 'HTTP_X_PROFILE'
+
+
+def make_token(user, mode=Profile.SAMPLE):
+    return signing.dumps({'user': user.pk, 'mode': mode}, salt=SALT)
+
+
+def requested_mode(request):
+    """Режим профилирования запроса или None, если токена нет
+    или он не принадлежит вошедшему сотруднику."""
+    token = request.GET.get(QUERY_PARAMETER) or request.META.get(HEADER)
+    if not token:
+        return None
+    try:
+        data = signing.loads(
+            token, salt=SALT, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    user = request.user
+    if not (user.is_active and user.is_staff and user.pk == data['user']):
+        return None
+    if data['mode'] not in dict(Profile.MODES):
+        return None
+    return data['mode']
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(settings.BASE_DIR):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class Sampler:
+    """Снимает стек одного потока через равные промежутки времени."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as folded:
+            for stack, count in self.stacks.most_common():
+                folded.write(f'{stack} {count}\n')
+
+
+def _run_sampler(request, get_response, path):
+    with Sampler(threading.get_ident(),
+                 settings.PROFILING_INTERVAL) as sampler:
+        response = get_response(request)
+    sampler.write(path)
+    return response, sum(sampler.stacks.values())
+
+
+def _run_cprofile(request, get_response, path):
+    profiler = cProfile.Profile()
+    response = profiler.runcall(get_response, request)
+    profiler.dump_stats(path)
+    return response, None
+
+
+def _run_memory(request, get_response, path):
+    with memory.traced() as started:
+        # Без сброса пик относится к запросу, только если трассировка
+        # включена для него.
+        peak_known = memory.reset_peak() or started
+        before = memory.take_snapshot()
+        response = get_response(request)
+        after = memory.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    if not peak_known:
+        peak = None
+    with open(path, 'w', encoding='utf-8') as report:
+        report.write(f'Пик выделенной памяти: {memory.format_size(peak)}\n')
+        report.write('Рост по строкам кода:\n')
+        for line in memory.top_lines(after, before):
+            report.write(f'{line}\n')
+    return response, None
+
+
+# Режим: функция профилирования и расширение файла профиля.
+RUNNERS = {
+    Profile.SAMPLE: (_run_sampler, 'folded'),
+    Profile.CPROFILE: (_run_cprofile, 'prof'),
+    Profile.MEMORY: (_run_memory, 'txt'),
+}
+
+
+def profile(request, get_response, mode):
+    """Выполняет запрос под профилировщиком и сохраняет профиль."""
+    run, extension = RUNNERS[mode]
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    name = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid4().hex[:8]}.{extension}'
+
+    start = time.perf_counter()
+    response, samples = run(
+        request, get_response, os.path.join(settings.PROFILING_DIR, name))
+    duration = time.perf_counter() - start
+
+    resolver_match = request.resolver_match
+    saved = Profile.objects.create(
+        user=request.user,
+        method=request.method,
+        path=request.get_full_path()[:500],
+        view=resolver_match.view_name if resolver_match else '',
+        status=response.status_code,
+        mode=mode,
+        duration=round(duration * 1000, 2),
+        samples=samples,
+        file=name,
+    )
+    response['X-Profile-Id'] = str(saved.pk)
+    return response
@@ -0,0 +1,48 @@
+"""Плагин pytest для поиска N+1 (core.nplusone).
+
+С `--nplusone` находки каждого теста выводятся предупреждениями,
+с `--nplusone-strict` тест с находками падает. Запросы к сайту
+через тестовый клиент считаются по отдельности (NPlusOneMiddleware),
+остальные запросы теста — вместе.
+"""
+import warnings
+
+import pytest
+
+
+class NPlusOneWarning(UserWarning):
+    pass
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('nplusone')
+    group.addoption(
+        '--nplusone',
+        action='store_true',
+        help='Предупреждать о запросах N+1 в тестах.'
+    )
+    group.addoption(
+        '--nplusone-strict',
+        action='store_true',
+        help='Проваливать тесты с запросами N+1.'
+    )
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    strict = item.config.getoption('nplusone_strict')
+    if not (strict or item.config.getoption('nplusone')):
+        return (yield)
+    # Модели и шаблоны доступны только после настройки Django.
+    from . import nplusone
+
+    # Если тест упал сам, исключение выйдет из yield и находки
+    # не заслонят причину падения.
+    with nplusone.detect(item.nodeid) as findings:
+        result = yield
+    if findings:
+        message = '\n\n'.join(map(str, findings))
+        if strict:
+            pytest.fail(message, pytrace=False)
+        warnings.warn(NPlusOneWarning(message))
+    return result
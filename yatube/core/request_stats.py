@@ -0,0 +1,207 @@
+"""Сбор показателей одного запроса: база, шаблоны, кеш.
+
+ServerTimingMiddleware кладет RequestStats текущего запроса в contextvar,
+а перехватчики ниже дописывают в него замеры. Вне запроса (команды,
+фоновые задачи) contextvar пуст и перехватчики ничего не считают.
+
+Время шаблонов считается и по каждому шаблону (включая include),
+и по тегам и фильтрам из TIMED_TAGS и TIMED_FILTERS: число вызовов
+и время вместе с вложенными шаблонами и тегами.
+"""
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.base import Template
+from django.templatetags.cache import CacheNode
+from sorl.thumbnail.templatetags.thumbnail import ThumbnailNodeBase
+
+from .templatetags import user_filters
+
+_current = ContextVar('request_stats', default=None)
+
+# Узлы тегов, время которых считается; имя берется из тега в шаблоне.
+TIMED_TAGS = (
+    (CacheNode, 'render'),
+    (ThumbnailNodeBase, 'render'),
+)
+# Фильтры проекта, время которых считается.
+TIMED_FILTERS = (
+    (user_filters.register, 'addclass'),
+)
+
+
+class RequestStats:
+    """Показатели запроса; время хранится в секундах."""
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Имя маршрута, известно после разрешения URL.
+        self.view_name = None
+        # Имя шаблона или тега: [число вызовов, время].
+        self.templates = {}
+        self.tags = {}
+        # Вложенные шаблоны (include) входят во время внешнего.
+        self._render_depth = 0
+        self._cache_depth = 0
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        """Обертка connection.execute_wrapper: время и число запросов."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.db_queries += 1
+
+    @staticmethod
+    def add_timing(timings, name, duration):
+        timing = timings.setdefault(name, [0, 0.0])
+        timing[0] += 1
+        timing[1] += duration
+
+
+def current():
+    """RequestStats текущего запроса или None."""
+    return _current.get()
+
+
+def activate(stats):
+    return _current.set(stats)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(self, context):
+        stats = _current.get()
+        if stats is None:
+            return render(self, context)
+        stats._render_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            duration = time.perf_counter() - start
+            stats._render_depth -= 1
+            if not stats._render_depth:
+                stats.template_time += duration
+            stats.add_timing(
+                stats.templates,
+                self.origin.template_name or self.name or '<string>',
+                duration)
+    return wrapper
+
+
+def _timed_tag(render):
+    @wraps(render)
+    def wrapper(self, context):
+        stats = _current.get()
+        if stats is None:
+            return render(self, context)
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            stats.add_timing(
+                stats.tags, self.token.contents.split()[0],
+                time.perf_counter() - start)
+    return wrapper
+
+
+def _timed_filter(name):
+    def decorator(template_filter):
+        @wraps(template_filter)
+        def wrapper(*args, **kwargs):
+            stats = _current.get()
+            if stats is None:
+                return template_filter(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return template_filter(*args, **kwargs)
+            finally:
+                stats.add_timing(
+                    stats.tags, name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _count_cache(stats, hits, misses):
+    stats.cache_hits += hits
+    stats.cache_misses += misses
+
+
+def _counted_get(get):
+    @wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        stats = _current.get()
+        if stats is None or stats._cache_depth:
+            return get(self, key, default, version)
+        stats._cache_depth += 1
+        try:
+            value = get(self, key, default, version)
+        finally:
+            stats._cache_depth -= 1
+        hit = value is not default
+        _count_cache(stats, hit, not hit)
+        return value
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(self, keys, version=None):
+        stats = _current.get()
+        if stats is None or stats._cache_depth:
+            return get_many(self, keys, version)
+        keys = list(keys)
+        # BaseCache.get_many вызывает get: считаем только внешний вызов.
+        stats._cache_depth += 1
+        try:
+            found = get_many(self, keys, version)
+        finally:
+            stats._cache_depth -= 1
+        _count_cache(stats, len(found), len(keys) - len(found))
+        return found
+    return wrapper
+
+
+def _wrap_once(function, decorator):
+    """Повторная установка того же перехватчика пропускается."""
+    applied = getattr(function, 'patched_by', ())
+    marker = f'{decorator.__module__}.{decorator.__qualname__}'
+    if marker in applied:
+        return function
+    wrapper = decorator(function)
+    wrapper.patched_by = applied + (marker,)
+    return wrapper
+
+
+def patch(cls, name, decorator):
+    setattr(cls, name, _wrap_once(getattr(cls, name), decorator))
+
+
+def patch_filter(library, name, decorator):
+    library.filters[name] = _wrap_once(library.filters[name], decorator)
+
+
+def install():
+    """Ставит перехватчики шаблонов и кеша; повторный вызов безопасен."""
+    patch(Template, 'render', _timed_render)
+    for node, method in TIMED_TAGS:
+        patch(node, method, _timed_tag)
+    for library, name in TIMED_FILTERS:
+        patch_filter(library, name, _timed_filter(name))
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        patch(backend, 'get', _counted_get)
+        patch(backend, 'get_many', _counted_get_many)
@@ -0,0 +1,155 @@
+"""Журнал медленных запросов к базе.
+
+Обертка execute ставится на каждое соединение при его открытии
+(сигнал connection_created, см. CoreConfig.ready). Запрос дольше
+settings.SLOW_QUERY_THRESHOLD секунд пишется в лог yatube.slow_queries
+и в модель SlowQuery (раздел админки «Медленные запросы») вместе
+с нормализованным SQL, маршрутом и планом EXPLAIN.
+
+EXPLAIN и запись в базу выполняет фоновый поток на своем соединении:
+запрос к сайту не ждет их, не держит блокировки базы дольше нужного,
+а лишние запросы не попадают в его счетчики и поиск N+1.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import metrics
+
+logger = logging.getLogger('yatube.slow_queries')
+
+# Запросы самого журнала (EXPLAIN, запись SlowQuery) не проверяются.
+_recording = ContextVar('slow_query_recording', default=False)
+
+_PLACEHOLDER_LISTS = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_SPACES = re.compile(r'\s+')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def normalize(sql):
+    """SQL без значений: одинаковые запросы с разными параметрами
+    и списками IN разной длины дают одну строку."""
+    sql = _STRINGS.sub('%s', sql)
+    sql = _NUMBERS.sub('%s', sql)
+    sql = _PLACEHOLDER_LISTS.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def explain(connection, sql, params):
+    """План запроса; курсор без оберток, чтобы EXPLAIN не попал
+    в замеры запроса."""
+    connection.ensure_connection()
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(
+            f'{connection.ops.explain_query_prefix()} {sql}', params)
+        return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_THRESHOLD
+    if threshold is None or _recording.get():
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - start
+    if duration >= threshold:
+        record(context['connection'], sql, params, many, duration)
+    return result
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Один поток: записи SlowQuery не спорят за блокировку базы.
+            _executor = ThreadPoolExecutor(
+                1, thread_name_prefix='slow_queries')
+    return _executor
+
+
+def record(connection, sql, params, many, duration):
+    """Передает медленный запрос фоновому потоку; маршрут берется
+    здесь, пока известен текущий запрос к сайту."""
+    _get_executor().submit(
+        _save, connection.alias, sql, params, many, duration,
+        metrics.view_label(),
+    )
+
+
+def flush():
+    """Ждет, пока фоновый поток запишет все переданные запросы."""
+    _get_executor().submit(lambda: None).result()
+
+
+def _save(alias, sql, params, many, duration, view):
+    token = _recording.set(True)
+    try:
+        _write(connections[alias], sql, params, many, duration, view)
+    except Exception:
+        logger.exception('Медленный запрос не записан')
+    finally:
+        _recording.reset(token)
+        # Соединения потока пула сами не закрываются.
+        connections[alias].close()
+
+
+def _write(connection, sql, params, many, duration, view):
+    from .models import SlowQuery
+
+    plan = ''
+    if not many and sql.lstrip()[:6].upper() == 'SELECT':
+        try:
+            plan = explain(connection, sql, params)
+        except DatabaseError:
+            logger.exception('EXPLAIN не выполнился')
+    entry = {
+        'sql': normalize(sql),
+        'view': view,
+        'duration_ms': round(duration * 1000, 2),
+        'plan': plan,
+    }
+    logger.warning(json.dumps(entry, ensure_ascii=False))
+
+    with transaction.atomic(using=connection.alias):
+        updated = SlowQuery.objects.using(connection.alias).filter(
+            sql=entry['sql'], view=entry['view']
+        ).update(
+            plan=plan,
+            count=F('count') + 1,
+            total_duration=F('total_duration') + entry['duration_ms'],
+            max_duration=Greatest('max_duration', entry['duration_ms']),
+            last_seen=timezone.now(),
+        )
+        if not updated:
+            SlowQuery.objects.using(connection.alias).create(
+                sql=entry['sql'],
+                view=entry['view'],
+                plan=plan,
+                count=1,
+                total_duration=entry['duration_ms'],
+                max_duration=entry['duration_ms'],
+                last_seen=timezone.now(),
+            )
+
+
+def install_wrapper(sender, connection, **kwargs):
+    """Обработчик connection_created."""
+    if slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(slow_query_wrapper)
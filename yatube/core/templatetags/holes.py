@@ -0,0 +1,50 @@
+"""Пробивка «дыр» в общих закешированных фрагментах.
+
+`{% hole 'name' key=value %}` оставляет во фрагменте метку вместо
+зависящей от читателя разметки, поэтому одна закешированная копия
+годится всем. `{% fillholes %}...{% endfillholes %}` после рендера
+(и после чтения из кеша) заменяет метки шаблонами
+`includes/holes/<name>.html`, отрендеренными для текущего читателя.
+Аргументы меток — только простые значения вроде id.
+"""
+import json
+import re
+
+from django import template
+from django.template.loader import get_template
+from django.utils.html import mark_safe
+
+register = template.Library()
+
+HOLE_RE = re.compile(r'<!--hole:(?P<name>\w+) (?P<args>\{.*?\})-->')
+
+
+@register.simple_tag
+def hole(name, **kwargs):
+    return mark_safe(f'<!--hole:{name} {json.dumps(kwargs)}-->')
+
+
+class FillHolesNode(template.Node):
+    def __init__(self, nodelist):
+        self.nodelist = nodelist
+
+    def render(self, context):
+        content = self.nodelist.render(context)
+        templates = {}
+        flat = context.flatten()
+
+        def fill(match):
+            name = match.group('name')
+            if name not in templates:
+                templates[name] = get_template(f'includes/holes/{name}.html')
+            return templates[name].render(
+                {**flat, **json.loads(match.group('args'))})
+
+        return HOLE_RE.sub(fill, content)
+
+
+@register.tag
+def fillholes(parser, token):
+    nodelist = parser.parse(('endfillholes',))
+    parser.delete_first_token()
+    return FillHolesNode(nodelist)
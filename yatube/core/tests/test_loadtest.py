@@ -0,0 +1,89 @@
+import json
+import os
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import LiveServerTestCase
+
+from core.management.commands.loadtest import DEFAULT_MIX
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class LoadtestCommandTest(LiveServerTestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(
+            username='reader', password='password')
+        Follow.objects.create(user=self.reader, author=self.author)
+        group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Post.objects.create(
+            text='Тестовый пост', author=self.author, group=group)
+
+    def _report_path(self):
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        return os.path.join(tmp_dir.name, 'report.json')
+
+    def test_loadtest_reports_every_endpoint(self):
+        """Проверка: loadtest проходит все адреса смеси без ошибок."""
+        report_path = self._report_path()
+        # Один поток: общая база LiveServerTestCase в памяти
+        # не выдерживает параллельной записи.
+        call_command(
+            'loadtest',
+            url=self.live_server_url,
+            workers=1,
+            duration=1,
+            logged_in=1,
+            json=report_path,
+            seed=1,
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+        with open(report_path) as report_file:
+            report = json.load(report_file)
+
+        self.assertEqual(set(report), set(DEFAULT_MIX))
+        for endpoint, row in report.items():
+            with self.subTest(endpoint=endpoint):
+                self.assertGreater(row['requests'], 0)
+                self.assertEqual(row['error_rate'], 0)
+        self.assertTrue(Comment.objects.exists())
+
+    def test_loadtest_concurrent_mixed_sessions(self):
+        """Проверка: несколько потоков анонимов и вошедших читателей
+        одновременно читают ленты без ошибок."""
+        report_path = self._report_path()
+        # Только чтение: параллельная запись в общую базу в памяти
+        # упирается в блокировки таблиц SQLite.
+        call_command(
+            'loadtest',
+            url=self.live_server_url,
+            workers=4,
+            duration=1,
+            logged_in=0.5,
+            mix={'index': 1, 'profile': 1, 'post_detail': 1,
+                 'follow_index': 1},
+            json=report_path,
+            seed=1,
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+        with open(report_path) as report_file:
+            report = json.load(report_file)
+
+        # follow_index запрашивают только вошедшие, остальное — все.
+        self.assertEqual(
+            set(report), {'index', 'profile', 'post_detail', 'follow_index'})
+        for endpoint, row in report.items():
+            with self.subTest(endpoint=endpoint):
+                self.assertGreater(row['requests'], 0)
+                self.assertEqual(row['error_rate'], 0)
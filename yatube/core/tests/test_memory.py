@@ -0,0 +1,124 @@
+import json
+import os
+import tempfile
+import tracemalloc
+from shutil import rmtree
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import memory
+from core.models import Profile
+from core.profiling import make_token
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_PROFILING_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(PROFILING_DIR=TEMP_PROFILING_DIR)
+class MemoryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            username='staff', is_staff=True, is_superuser=True)
+        cls.user = User.objects.create_user(username='user')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        rmtree(TEMP_PROFILING_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.addCleanup(memory.stop)
+
+    def test_snapshots_diff(self):
+        """Проверка: сотрудник включает tracemalloc, снимает снимки
+        и видит рост памяти между ними."""
+        self.client.force_login(self.staff)
+        url = reverse('memory')
+        self.client.post(url, {'action': 'start'})
+        self.assertTrue(tracemalloc.is_tracing())
+        self.client.post(url, {'action': 'snapshot'})
+        leak = [bytearray(1024) for _ in range(100)]  # noqa: F841
+        self.client.post(url, {'action': 'snapshot'})
+
+        old, new = memory.snapshots()
+        response = self.client.get(url, {'old': old.id, 'new': new.id})
+        self.assertContains(response, f'Рост со снимка №{old.id}')
+        self.assertContains(response, 'core/tests/test_memory.py:')
+
+        self.client.post(url, {'action': 'stop'})
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(memory.snapshots(), [])
+
+    def test_bad_snapshot_id(self):
+        """Проверка: неверный номер снимка дает 400, а не ошибку."""
+        self.client.force_login(self.staff)
+        for params in ({'new': 'abc'}, {'old': '1.5'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('memory'), params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_reset_peak(self):
+        """Проверка: сброс пика опускает его до текущего уровня,
+        трассировка продолжается."""
+        memory.start()
+        garbage = bytearray(1024 * 1024)
+        del garbage
+        memory.reset_peak()
+        current, peak = tracemalloc.get_traced_memory()
+        self.assertTrue(tracemalloc.is_tracing())
+        self.assertLess(peak - current, 1024 * 1024)
+
+    def test_peak_skipped_without_reset_peak(self):
+        """Проверка: без tracemalloc.reset_peak (до Python 3.9) пик
+        запроса не пишется, а трассировка не перезапускается."""
+        if hasattr(tracemalloc, 'reset_peak'):
+            reset_peak = tracemalloc.reset_peak
+            del tracemalloc.reset_peak
+            self.addCleanup(setattr, tracemalloc, 'reset_peak', reset_peak)
+        memory.start()
+        kept = bytearray(1024)
+        with self.assertLogs('yatube.memory', 'INFO') as logs:
+            self.client.get(reverse('posts:post_detail', args=[self.post.pk]))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertIsNone(line['traced_peak_kb'])
+        self.assertTrue(tracemalloc.is_tracing())
+        self.assertIsNotNone(tracemalloc.get_object_traceback(kept))
+
+    def test_staff_only(self):
+        """Проверка: страница памяти только для сотрудников."""
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('memory'), {'action': 'start'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_peak_logged_for_heavy_views(self):
+        """Проверка: память запроса к тяжелому маршруту пишется в лог."""
+        memory.start()
+        with self.assertLogs('yatube.memory', 'INFO') as logs:
+            self.client.get(reverse('posts:post_detail', args=[self.post.pk]))
+            self.client.get(reverse('posts:main-view'))
+        self.assertEqual(len(logs.records), 1)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['view'], 'posts:post_detail')
+        self.assertGreater(line['traced_peak_kb'], 0)
+
+    def test_request_memory_profile(self):
+        """Проверка: профиль памяти одного запроса по токену."""
+        self.client.force_login(self.staff)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]),
+            HTTP_X_PROFILE=make_token(self.staff, Profile.MEMORY),
+        )
+        saved = Profile.objects.get(pk=response['X-Profile-Id'])
+        with open(os.path.join(TEMP_PROFILING_DIR, saved.file),
+                  encoding='utf-8') as report:
+            self.assertIn('Пик выделенной памяти', report.read())
+        # Трассировка, включенная на время запроса, выключается.
+        self.assertFalse(tracemalloc.is_tracing())
@@ -0,0 +1,183 @@
+import multiprocessing
+import os
+import tempfile
+from shutil import rmtree
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import get_thumbnail
+
+from core import metrics
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def _count_in_child():
+    metrics.inc('yatube_db_queries_total', 5, view='posts:main-view')
+
+
+class MetricsTestMixin:
+    """Свой каталог метрик на каждый тест: файл процесса открыт
+    по пути каталога, поэтому старый каталог не очищается, а меняется."""
+
+    def setUp(self):
+        super().setUp()
+        metrics_dir = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(rmtree, metrics_dir, ignore_errors=True)
+        settings_override = self.settings(METRICS_DIR=metrics_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class MetricsRegistryTest(MetricsTestMixin, SimpleTestCase):
+    def test_values_are_summed_across_processes(self):
+        """Проверка: значения разных процессов складываются."""
+        metrics.inc('yatube_db_queries_total', 2, view='posts:main-view')
+        child = multiprocessing.get_context('fork').Process(
+            target=_count_in_child)
+        child.start()
+        child.join()
+        metrics.inc('yatube_db_queries_total', 1, view='posts:main-view')
+
+        self.assertEqual(
+            metrics.collect()[
+                'yatube_db_queries_total', (('view', 'posts:main-view'),)],
+            8
+        )
+
+    def test_stale_files_removed(self):
+        """Проверка: файл завершенного процесса удаляется, когда
+        процесс впервые пишет метрики."""
+        child = multiprocessing.get_context('fork').Process(
+            target=_count_in_child)
+        child.start()
+        child.join()
+        self.assertEqual(len(os.listdir(settings.METRICS_DIR)), 1)
+
+        metrics.inc('yatube_db_queries_total', 1, view='posts:main-view')
+        self.assertEqual(
+            os.listdir(settings.METRICS_DIR),
+            [f'metrics_{os.getpid()}.db']
+        )
+        self.assertEqual(
+            metrics.collect()[
+                'yatube_db_queries_total', (('view', 'posts:main-view'),)],
+            1
+        )
+
+    def test_file_grows(self):
+        """Проверка: файл процесса растет, значения не теряются."""
+        for number in range(3000):
+            metrics.inc('yatube_db_queries_total', view=f'view-{number}')
+        series = metrics.collect()
+        self.assertEqual(len(series), 3000)
+        self.assertEqual(set(series.values()), {1})
+
+    def test_histogram_exposition(self):
+        """Проверка: корзины гистограммы накопительные."""
+        for duration in (0.003, 0.03, 0.03, 20):
+            metrics.observe(
+                'yatube_request_duration_seconds', duration, view='v')
+        text = metrics.render()
+        self.assertIn(
+            '# TYPE yatube_request_duration_seconds histogram', text)
+        for line in (
+            'yatube_request_duration_seconds_bucket{le="0.005",view="v"} 1',
+            'yatube_request_duration_seconds_bucket{le="0.05",view="v"} 3',
+            'yatube_request_duration_seconds_bucket{le="10",view="v"} 3',
+            'yatube_request_duration_seconds_bucket{le="+Inf",view="v"} 4',
+            'yatube_request_duration_seconds_count{view="v"} 4',
+        ):
+            self.assertIn(line, text.splitlines())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, METRICS_TOKEN='secret')
+class MetricsEndpointTest(MetricsTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост',
+            author=author,
+            image=SimpleUploadedFile('small.gif', small_gif, 'image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        for cache in caches.all():
+            cache.clear()
+
+    def test_request_metrics(self):
+        """Проверка: время, запросы, кеш фрагментов и шаблоны
+        учитываются по имени маршрута."""
+        self.client.get(reverse('posts:main-view'))
+        self.client.get(reverse('posts:main-view'))
+        lines = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        ).content.decode()
+        lines = lines.splitlines()
+
+        view = 'view="posts:main-view"'
+        self.assertIn(
+            f'yatube_request_duration_seconds_count{{{view}}} 2', lines)
+        self.assertTrue(any(
+            line.startswith(f'yatube_db_queries_total{{{view}}}')
+            for line in lines
+        ))
+        self.assertIn(
+            'yatube_fragment_cache_misses_total'
+            f'{{fragment="index_page",{view}}} 1', lines)
+        self.assertIn(
+            'yatube_fragment_cache_hits_total'
+            f'{{fragment="index_page",{view}}} 1', lines)
+        self.assertIn(
+            'yatube_template_renders_total'
+            f'{{template="posts/index.html",{view}}} 2', lines)
+        self.assertIn(
+            f'yatube_template_tag_calls_total{{tag="cache",{view}}} 3', lines)
+
+    def test_thumbnails_counted_once(self):
+        """Проверка: считаются созданные миниатюры, а не найденные."""
+        get_thumbnail(self.post.image, '2x1', upscale=False)
+        get_thumbnail(self.post.image, '2x1', upscale=False)
+        series = metrics.collect()
+        self.assertEqual(
+            series['yatube_thumbnails_generated_total',
+                   (('view', 'background'),)],
+            1
+        )
+
+    def test_token_required(self):
+        """Проверка: метрики отдаются только с токеном сборщика,
+        без настроенного токена страница выключена."""
+        for header in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+            with self.subTest(header=header):
+                response = self.client.get(reverse('metrics'), **header)
+                self.assertEqual(response.status_code, 404)
+        with self.settings(METRICS_TOKEN=None):
+            response = self.client.get(
+                reverse('metrics'), HTTP_AUTHORIZATION='Bearer None')
+            self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
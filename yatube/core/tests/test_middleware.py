@@ -0,0 +1,80 @@
+import json
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+class ServerTimingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.create(text='Тестовый пост', author=cls.author)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def metrics(self, response):
+        return {
+            match['name']: match['params']
+            for match in re.finditer(
+                r'(?P<name>\w+)(?P<params>[^,]*)',
+                response['Server-Timing']
+            )
+        }
+
+    def test_server_timing_header(self):
+        """Проверка: заголовок Server-Timing с показателями запроса."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:main-view'))
+        metrics = self.metrics(response)
+        self.assertEqual(
+            set(metrics), {'db', 'tpl', 'cache', 'view', 'total'})
+        self.assertIn(f'desc="{len(queries)} queries"', metrics['db'])
+        self.assertRegex(metrics['tpl'], r';dur=\d+\.\d\d')
+        self.assertIn('"0 hits', metrics['cache'])
+
+        # Повторный запрос берет ленту из кеша.
+        response = self.client.get(reverse('posts:main-view'))
+        self.assertNotIn('"0 hits', self.metrics(response)['cache'])
+
+    def test_request_log_line(self):
+        """Проверка: по запросу пишется строка лога в JSON."""
+        with self.assertLogs('yatube.requests', 'INFO') as logs:
+            self.client.get(reverse('posts:main-view'))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['path'], reverse('posts:main-view'))
+        self.assertEqual(line['status'], 200)
+        self.assertGreater(line['db_queries'], 0)
+        self.assertGreaterEqual(line['total_ms'], line['view_ms'])
+
+    def test_template_and_tag_timings(self):
+        """Проверка: время и число вызовов по шаблонам и тегам."""
+        Post.objects.create(text='Второй пост', author=self.author)
+        with self.assertLogs('yatube.requests', 'INFO') as logs:
+            self.client.get(reverse('posts:main-view'))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['templates']['includes/postcard.html']['calls'],
+                         2)
+        self.assertEqual(line['templates']['posts/index.html']['calls'], 1)
+        # Фрагмент ленты и две карточки.
+        self.assertEqual(line['tags']['cache']['calls'], 3)
+        self.assertGreaterEqual(
+            line['templates']['posts/index.html']['ms'],
+            line['templates']['includes/postcard.html']['ms'],
+        )
+
+        self.client.force_login(self.author)
+        with self.assertLogs('yatube.requests', 'INFO') as logs:
+            self.client.get(reverse('posts:post_create'))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['tags']['addclass']['calls'], 3)
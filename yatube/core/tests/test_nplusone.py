@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.template import Context, Engine
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import nplusone
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+COMMENTS_TEMPLATE = '''{% for comment in comments %}
+  <p>{{ comment.text }}</p>
+  <a>{{ comment.author.username }}</a>
+{% endfor %}'''
+
+
+class NPlusOneTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Тестовый пост', author=author)
+        for number in range(3):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'reader{number}'),
+                text='Комментарий',
+            )
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def render(self, comments):
+        engine = Engine(loaders=[(
+            'django.template.loaders.locmem.Loader',
+            {'includes/comments.html': COMMENTS_TEMPLATE},
+        )])
+        template = engine.get_template('includes/comments.html')
+        return template.render(Context({'comments': comments}))
+
+    def test_finding_points_at_template_line(self):
+        """Проверка: находка указывает на строку шаблона."""
+        with nplusone.detect(threshold=2) as findings:
+            self.render(Comment.objects.all())
+        self.assertEqual(len(findings), 1)
+        self.assertEqual(findings[0].count, 3)
+        self.assertIn('FROM "auth_user"', findings[0].sql)
+        self.assertEqual(
+            findings[0].stack[0],
+            'includes/comments.html:3 comment.author.username'
+        )
+        self.assertTrue(any(
+            line.startswith('core/tests/test_nplusone.py:')
+            for line in findings[0].stack
+        ))
+
+    def test_no_finding_below_threshold(self):
+        """Проверка: select_related убирает находку."""
+        with nplusone.detect(threshold=2) as findings:
+            self.render(Comment.objects.select_related('author'))
+        self.assertEqual(findings, [])
+
+    def test_nested_scopes(self):
+        """Проверка: находки вложенной области передаются внешней,
+        а ее запросы не считаются внешней повторно."""
+        with nplusone.detect(threshold=2) as outer:
+            with nplusone.detect('внутренняя', threshold=2) as inner:
+                self.render(Comment.objects.all())
+            self.render(Comment.objects.select_related('author'))
+        self.assertEqual(len(inner), 1)
+        self.assertEqual(outer, inner)
+        self.assertEqual(outer[0].where, 'внутренняя')
+
+    @override_settings(NPLUSONE_DETECTION=True, NPLUSONE_THRESHOLD=0)
+    def test_middleware_logs_findings(self):
+        """Проверка: находки запроса к сайту пишутся в лог."""
+        with self.assertLogs('yatube.nplusone', 'WARNING') as logs:
+            self.client.get(reverse('posts:main-view'))
+        self.assertIn(f'(GET {reverse("posts:main-view")})', logs.output[0])
+
+    @override_settings(
+        NPLUSONE_DETECTION=True, NPLUSONE_THRESHOLD=0, NPLUSONE_STRICT=True)
+    def test_middleware_strict(self):
+        """Проверка: в строгом режиме находка — ошибка."""
+        with self.assertRaises(nplusone.NPlusOneError):
+            with self.assertLogs('yatube.nplusone', 'WARNING'):
+                self.client.get(reverse('posts:main-view'))
+
+    @override_settings(NPLUSONE_DETECTION=False, NPLUSONE_THRESHOLD=0)
+    def test_middleware_disabled(self):
+        """Проверка: без NPLUSONE_DETECTION запросы не считаются."""
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('yatube.nplusone', 'WARNING'):
+                self.client.get(reverse('posts:main-view'))
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import threading
+import time
+from shutil import rmtree
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.models import Profile
+from core.profiling import Sampler, make_token
+
+User = get_user_model()
+
+TEMP_PROFILING_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class SamplerTest(SimpleTestCase):
+    def test_folded_stacks(self):
+        """Проверка: выборки — свернутые стеки от корня к листу."""
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,))
+        worker.start()
+        with Sampler(worker.ident, 0.001) as sampler:
+            time.sleep(0.05)
+        stop.set()
+        worker.join()
+
+        self.assertGreater(sum(sampler.stacks.values()), 0)
+        stack = sampler.stacks.most_common(1)[0][0]
+        self.assertTrue(stack.startswith('_bootstrap ('))
+        self.assertIn(';busy_loop (core/tests/test_profiling.py:', stack)
+
+
+@override_settings(PROFILING_DIR=TEMP_PROFILING_DIR)
+class ProfilingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            username='staff', is_staff=True, is_superuser=True)
+        cls.user = User.objects.create_user(username='user')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        rmtree(TEMP_PROFILING_DIR, ignore_errors=True)
+
+    def test_staff_request_profiled(self):
+        """Проверка: запрос сотрудника с токеном профилируется,
+        профиль сохраняется в файл и в админку."""
+        self.client.force_login(self.staff)
+        for mode, extension in (('sample', '.folded'), ('cprofile', '.prof')):
+            with self.subTest(mode=mode):
+                response = self.client.get(
+                    reverse('posts:main-view'),
+                    HTTP_X_PROFILE=make_token(self.staff, mode),
+                )
+                saved = Profile.objects.get(pk=response['X-Profile-Id'])
+                self.assertEqual(saved.mode, mode)
+                self.assertEqual(saved.view, 'posts:main-view')
+                self.assertEqual(saved.user, self.staff)
+                self.assertTrue(saved.file.endswith(extension))
+                self.assertTrue(os.path.exists(
+                    os.path.join(TEMP_PROFILING_DIR, saved.file)))
+
+                response = self.client.get(
+                    reverse('profile_download', args=[saved.pk]))
+                self.assertEqual(response.status_code, 200)
+
+                response = self.client.get(
+                    reverse('admin:core_profile_changelist'))
+                self.assertContains(response, saved.file)
+
+    def test_token_of_other_user_ignored(self):
+        """Проверка: чужой токен и токен не сотрудника не работают."""
+        cases = (
+            (self.user, make_token(self.user)),
+            (self.user, make_token(self.staff)),
+            (self.staff, make_token(self.staff) + 'x'),
+        )
+        for user, token in cases:
+            with self.subTest(user=user.username):
+                self.client.force_login(user)
+                response = self.client.get(
+                    reverse('posts:main-view'), {'_profile': token})
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertFalse(Profile.objects.exists())
+
+    def test_token_page_staff_only(self):
+        """Проверка: токены выдаются только сотрудникам."""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('profile_token'))
+        self.assertEqual(response.status_code, 302)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('profile_token'))
+        self.assertContains(response, '?_profile=')
@@ -0,0 +1,107 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import LiveServerTestCase, SimpleTestCase
+
+from core.management.commands.replay_log import parse_log
+from posts.models import Group, Post
+
+User = get_user_model()
+
+AGENT = '"-" "Mozilla/5.0"'
+LOG = '\n'.join([
+    f'10.0.0.1 - - [18/Oct/2026:10:00:00 +0000] "GET / HTTP/1.1" 200 512 '
+    f'{AGENT}',
+    f'10.0.0.2 - - [18/Oct/2026:10:00:01 +0000] "GET /posts/{{post}}/ '
+    f'HTTP/1.1" 200 512 {AGENT}',
+    f'10.0.0.3 - - [18/Oct/2026:10:00:01 +0000] "GET /posts/{{post}}/ '
+    f'HTTP/1.1" 200 512 {AGENT}',
+    '10.0.0.4 - - [18/Oct/2026:10:00:02 +0000] "GET '
+    '/group/test_slug/?page=40 HTTP/1.1" 200 512 "-" "Googlebot/2.1"',
+    f'10.0.0.7 - - [18/Oct/2026:10:00:02 +0000] "HEAD /?page=3 HTTP/1.1" '
+    f'200 0 {AGENT}',
+    f'10.0.0.5 - - [18/Oct/2026:10:00:02 +0000] "POST /posts/{{post}}/'
+    f'comment/ HTTP/1.1" 302 0 {AGENT}',
+    '10.0.0.6 - - [18/Oct/2026:10:00:03 +0000] "GET /wp-login.php '
+    'HTTP/1.1" 404 0 "-" "scanner"',
+    'not a log line',
+])
+
+
+class ParseLogTest(SimpleTestCase):
+    def test_parse_log(self):
+        """Проверка: разбор лога, группы и пропущенные строки."""
+        requests, skipped = parse_log(LOG.format(post=1).splitlines())
+        # Посты и сообщества — отдельными группами по адресу,
+        # глубокие страницы — диапазоном номера.
+        self.assertEqual(
+            [request.group for request in requests],
+            ['posts:main-view', 'posts:post_detail /posts/1/',
+             'posts:post_detail /posts/1/',
+             'posts:group_posts /group/test_slug/ ?page=10-99',
+             'posts:main-view ?page=2-9']
+        )
+        self.assertEqual(
+            [request.offset for request in requests], [0, 1, 1, 2, 2])
+        self.assertEqual(requests[3].target, '/group/test_slug/?page=40')
+        self.assertEqual(requests[4].method, 'HEAD')
+        self.assertEqual(
+            dict(skipped),
+            {'метод POST': 1, 'нет маршрута': 1, 'не разобрано': 1}
+        )
+
+
+class ReplayLogCommandTest(LiveServerTestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='author')
+        group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        self.post = Post.objects.create(
+            text='Тестовый пост', author=author, group=group)
+        self.directory = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.directory, 'access.log')
+        with open(self.log_path, 'w') as log_file:
+            log_file.write(LOG.format(post=self.post.pk))
+
+    def replay(self, name):
+        path = os.path.join(self.directory, name)
+        call_command(
+            'replay_log',
+            self.log_path,
+            url=self.live_server_url,
+            speed=0,
+            workers=2,
+            json=path,
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+        return path
+
+    def test_replay_and_compare(self):
+        """Проверка: прогон лога и сравнение двух прогонов."""
+        base_path = self.replay('base.json')
+        with open(base_path) as run_file:
+            run = json.load(run_file)
+        groups = run['groups']
+        self.assertEqual(
+            groups[f'posts:post_detail /posts/{self.post.pk}/']['requests'],
+            2
+        )
+        self.assertEqual(groups['posts:main-view']['requests'], 1)
+        self.assertEqual(groups['posts:main-view ?page=2-9']['requests'], 1)
+        for group, row in groups.items():
+            with self.subTest(group=group):
+                self.assertEqual(row['error_rate'], 0)
+
+        new_path = self.replay('new.json')
+        out = StringIO()
+        call_command('replay_log', compare=[base_path, new_path], stdout=out)
+        self.assertIn('posts:post_detail', out.getvalue())
+        self.assertIn('p95', out.getvalue())
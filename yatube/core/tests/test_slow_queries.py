@@ -0,0 +1,89 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import (
+    SimpleTestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import SlowQuery
+from core.slow_queries import flush, normalize
+from posts.models import Post
+
+User = get_user_model()
+
+
+class NormalizeTest(SimpleTestCase):
+    def test_normalize(self):
+        """Проверка: значения и длина списков IN не различают запросы."""
+        self.assertEqual(
+            normalize(
+                'SELECT "id" FROM "posts_post"\n  WHERE "author_id" IN '
+                '(%s, %s, %s) AND "text" = \'it\'\'s\' LIMIT 10'
+            ),
+            'SELECT "id" FROM "posts_post" WHERE "author_id" IN (...) '
+            'AND "text" = %s LIMIT %s'
+        )
+
+
+# Журнал пишет из фонового потока, поэтому тест без общей транзакции:
+# иначе поток ждал бы ее блокировку. Порог снижается только на время
+# запроса к сайту, чтобы журнал не ловил запросы самого теста.
+class SlowQueryLogTest(TransactionTestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Тестовый пост', author=author)
+
+    def get(self, url):
+        with self.settings(SLOW_QUERY_THRESHOLD=0):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+        flush()
+        for cache in caches.all():
+            cache.clear()
+        return queries
+
+    def test_slow_queries_recorded(self):
+        """Проверка: медленные запросы пишутся в лог и в базу
+        с маршрутом и планом."""
+        with self.assertLogs('yatube.slow_queries', 'WARNING') as logs:
+            for _ in range(2):
+                self.get(reverse('posts:main-view'))
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['view'], 'posts:main-view')
+
+        queries = SlowQuery.objects.filter(
+            view='posts:main-view', sql__contains='FROM "posts_post"')
+        self.assertTrue(queries.exists())
+        for query in queries:
+            self.assertRegex(query.plan, 'SCAN|SEARCH')
+        # Повторы одного запроса собираются в одну запись.
+        self.assertEqual(queries.filter(count=2).count(), queries.count())
+        # Журнал не пишет сам себя.
+        self.assertFalse(SlowQuery.objects.filter(
+            view='posts:main-view', sql__contains='core_slowquery'
+        ).exists())
+
+    def test_request_queries_unchanged(self):
+        """Проверка: EXPLAIN и запись журнала не выполняются
+        в запросе к сайту."""
+        url = reverse('posts:main-view')
+        with CaptureQueriesContext(connection) as expected:
+            self.client.get(url)
+        for cache in caches.all():
+            cache.clear()
+        queries = self.get(url)
+        self.assertEqual(len(queries), len(expected))
+        self.assertTrue(SlowQuery.objects.exists())
+
+    @override_settings(SLOW_QUERY_THRESHOLD=None)
+    def test_disabled(self):
+        """Проверка: без порога запросы не проверяются."""
+        self.client.get(reverse('posts:main-view'))
+        self.assertFalse(
+            SlowQuery.objects.filter(view='posts:main-view').exists())
@@ -0,0 +1,75 @@
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import metrics
+
+
+class CountingThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, считающий созданные миниатюры.
+
+    Миниатюры из kvstore не считаются: _create_thumbnail вызывается,
+    только когда файла миниатюры еще нет.
+    """
+
+    def _create_thumbnail(self, source_image, geometry_string, options,
+                          thumbnail):
+        super()._create_thumbnail(
+            source_image, geometry_string, options, thumbnail)
+        metrics.inc(
+            'yatube_thumbnails_generated_total', view=metrics.view_label())
+
+
+def _thumbnail_file(backend, file_, geometry_string, options):
+    """Файл миниатюры с тем же именем, что дает backend.get_thumbnail,
+    без обращений к kvstore и хранилищу."""
+    source = ImageFile(file_)
+    options = dict(options)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry_string, options)
+    return ImageFile(name, default.storage)
+
+
+def stored_thumbnails(requested):
+    """Готовые миниатюры из kvstore sorl-thumbnail за один запрос.
+
+    requested — {ключ: (картинка, геометрия, параметры)}; возвращает
+    {ключ: миниатюра} для найденных. Результат, в том числе отсутствие
+    записи, кладется в кеш kvstore, поэтому следующий get_thumbnail
+    этих миниатюр не ищет их в базе. С другим kvstore ничего не ищет.
+    """
+    kvstore = default.kvstore
+    empty = cached_db_kvstore.EMPTY_VALUE
+    if not isinstance(kvstore, cached_db_kvstore.KVStore) or not requested:
+        return {}
+    keys = {
+        add_prefix(_thumbnail_file(
+            default.backend, file_, geometry_string, options).key): key
+        for key, (file_, geometry_string, options) in requested.items()
+    }
+    values = kvstore.cache.get_many(list(keys))
+    missing = [raw_key for raw_key in keys if raw_key not in values]
+    if missing:
+        rows = dict(KVStoreModel.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        fetched = {raw_key: rows.get(raw_key, empty)
+                   for raw_key in missing}
+        kvstore.cache.set_many(
+            fetched, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return {
+        keys[raw_key]: deserialize_image_file(value)
+        for raw_key, value in values.items() if value != empty
+    }
@@ -1,4 +1,16 @@
-from django.shortcuts import render
+import os
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.crypto import constant_time_compare
+
+from . import memory as memory_tools
+from . import metrics as metrics_registry
+from .models import Profile
+from .profiling import QUERY_PARAMETER, make_token
 
 
 def page_not_found(request, exception):
@@ -15,3 +27,86 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def metrics(request):
+    """Метрики всех процессов для сборщика (Prometheus).
+
+    Сборщик передает METRICS_TOKEN в заголовке Authorization: Bearer.
+    Без настроенного токена страница выключена.
+    """
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not token or not constant_time_compare(header, f'Bearer {token}'):
+        raise Http404
+    return HttpResponse(
+        metrics_registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@staff_member_required
+def profile_token(request):
+    """Токены профилирования для текущего сотрудника."""
+    lines = [
+        f'{mode}: ?{QUERY_PARAMETER}={make_token(request.user, mode)}'
+        for mode, _ in Profile.MODES
+    ]
+    return HttpResponse(
+        '\n'.join(lines) + '\n', content_type='text/plain; charset=utf-8')
+
+
+@staff_member_required
+def profile_download(request, pk):
+    saved = get_object_or_404(Profile, pk=pk)
+    path = os.path.join(settings.PROFILING_DIR, saved.file)
+    if not os.path.exists(path):
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True,
+                        filename=saved.file)
+
+
+MEMORY_ACTIONS = {
+    'start': memory_tools.start,
+    'stop': memory_tools.stop,
+    'snapshot': memory_tools.snapshot,
+}
+
+
+@staff_member_required
+def memory(request):
+    """Снимки tracemalloc воркера: включение, снимки и их разница."""
+    if request.method == 'POST':
+        action = MEMORY_ACTIONS.get(request.POST.get('action'))
+        if action is None or (
+                action is memory_tools.snapshot
+                and not tracemalloc.is_tracing()):
+            return HttpResponse(status=400)
+        action()
+        return redirect('memory')
+
+    try:
+        new_id, old_id = (
+            int(request.GET.get(name) or 0) for name in ('new', 'old'))
+    except ValueError:
+        return HttpResponse(status=400)
+    snapshots = memory_tools.snapshots()
+    new = memory_tools.get_snapshot(new_id) or (snapshots or [None])[-1]
+    old = memory_tools.get_snapshot(old_id)
+    current, peak = tracemalloc.get_traced_memory()
+    context = {
+        'tracing': tracemalloc.is_tracing(),
+        'pid': os.getpid(),
+        'rss': memory_tools.format_size(memory_tools.rss()),
+        'current': memory_tools.format_size(current),
+        'peak': memory_tools.format_size(peak),
+        # Пары (снимок, предыдущий) для ссылок на разницу.
+        'snapshots': list(zip(snapshots, [None] + snapshots[:-1])),
+        'new': new,
+        'old': old,
+        'top': (
+            memory_tools.top_lines(new.snapshot, old and old.snapshot)
+            if new else []
+        ),
+    }
+    return render(request, 'core/memory.html', context)
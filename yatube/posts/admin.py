@@ -23,6 +23,7 @@ class GroupAdmin(admin.ModelAdmin):
         'title',
         'slug',
         'description',
+        'posts_count',
     )
     search_fields = ('title', 'slug', 'description')
     list_filter = ('title', 'slug')
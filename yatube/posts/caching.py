@@ -0,0 +1,92 @@
+"""Теги кеша, от которых зависят ленты и страницы постов.
+
+Версии тегов ведет core.cache_tags: представления включают их в ключи,
+сигналы сбрасывают только теги, затронутые изменением.
+"""
+from core.cache_tags import invalidate_tags
+
+from .models import Follow, Post
+from .timelines import is_pulled
+from .utils import POSTS_TAG
+
+
+def author_tag(author_id):
+    return f'author:{author_id}'
+
+
+def group_tag(group_id):
+    return f'group:{group_id}'
+
+
+def post_tag(post_id):
+    return f'post:{post_id}'
+
+
+def follow_tag(user_id):
+    return f'follow:{user_id}'
+
+
+def follow_feed_tags(user, pulled):
+    """Лента подписок зависит от своей материализованной части
+    и от постов подмешиваемых авторов."""
+    return [follow_tag(user.pk), *(author_tag(pk) for pk in pulled)]
+
+
+def invalidate_post(post, *old_group_ids):
+    """Сбрасывает ленты, в которых виден пост, и страницу поста."""
+    tags = [POSTS_TAG, author_tag(post.author_id), post_tag(post.pk)]
+    tags.extend(
+        group_tag(group_id)
+        for group_id in (post.group_id, *old_group_ids)
+        if group_id is not None
+    )
+    # Посты популярных авторов подмешиваются в ленты по тегу автора,
+    # остальные лежат в лентах подписчиков.
+    if not is_pulled(post.author_id):
+        followers = Follow.objects.filter(
+            author_id=post.author_id).values_list('user_id', flat=True)
+        tags.extend(follow_tag(user_id) for user_id in followers)
+    invalidate_tags(*tags)
+
+
+def invalidate_related(author_id=None, group_id=None):
+    """Сбрасывает ленты, в карточках которых видны автор или группа.
+
+    Нужна после переименования: ключ карточки включает имена, а ленты
+    целиком лежат в кеше по своим тегам.
+    """
+    posts = Post.objects.all()
+    tags = [POSTS_TAG]
+    if author_id is not None:
+        posts = posts.filter(author_id=author_id)
+        tags.append(author_tag(author_id))
+    if group_id is not None:
+        posts = posts.filter(group_id=group_id)
+        tags.append(group_tag(group_id))
+    authors = set()
+    for post_author_id, post_group_id in posts.values_list(
+            'author_id', 'group_id').distinct():
+        authors.add(post_author_id)
+        tags.append(author_tag(post_author_id))
+        if post_group_id is not None:
+            tags.append(group_tag(post_group_id))
+    followers = Follow.objects.filter(
+        author_id__in=[pk for pk in authors if not is_pulled(pk)]
+    ).values_list('user_id', flat=True)
+    tags.extend(follow_tag(user_id) for user_id in followers)
+    invalidate_tags(*set(tags))
+
+
+def invalidate_followers(author_id):
+    """Сбрасывает ленты подписок всех подписчиков автора."""
+    followers = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    invalidate_tags(*(follow_tag(user_id) for user_id in followers))
+
+
+def invalidate_follow(follow):
+    invalidate_tags(follow_tag(follow.user_id))
+
+
+def invalidate_comments(comment):
+    invalidate_tags(post_tag(comment.post_id))
@@ -0,0 +1,102 @@
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import AuthorStat, Comment, Follow, Group, Post, User
+
+
+def shift(queryset, field, delta):
+    """Сдвигает счетчик на delta, не опуская его ниже нуля."""
+    return queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def shift_group_posts(group_id, delta):
+    if group_id is not None:
+        shift(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def _shift_author(author_id, field, delta):
+    updated = shift(AuthorStat.objects.filter(author_id=author_id),
+                    field, delta)
+    # Строка статистики появляется вместе с первым постом
+    # или подписчиком автора.
+    if not updated and delta > 0:
+        AuthorStat.objects.get_or_create(
+            author_id=author_id, defaults={field: delta}
+        )
+
+
+def shift_author_posts(author_id, delta):
+    _shift_author(author_id, 'posts_count', delta)
+
+
+def shift_author_followers(author_id, delta):
+    _shift_author(author_id, 'followers_count', delta)
+
+
+def shift_post_comments(post_id, delta):
+    shift(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def author_posts_count(author):
+    """Число постов автора из счетчика, без COUNT по постам."""
+    stat = getattr(author, 'stat', None)
+    return stat.posts_count if stat is not None else 0
+
+
+def _chunks(queryset, chunk_size):
+    last_pk = None
+    while True:
+        chunk = queryset.order_by('pk')
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        pks = list(chunk.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+def _reconcile(model, field, related, fk, chunk_size):
+    """Сверяет счетчик с COUNT по связанной модели, порциями по pk."""
+    fixed = 0
+    for pks in _chunks(model.objects.all(), chunk_size):
+        with transaction.atomic():
+            actual = dict(
+                related.objects.filter(**{f'{fk}__in': pks})
+                .order_by()
+                .values_list(fk)
+                .annotate(Count('pk'))
+            )
+            stale = []
+            for obj in model.objects.filter(pk__in=pks).only('pk', field):
+                value = actual.get(obj.pk, 0)
+                if getattr(obj, field) != value:
+                    setattr(obj, field, value)
+                    stale.append(obj)
+            model.objects.bulk_update(stale, [field])
+        fixed += len(stale)
+    return fixed
+
+
+def rebuild_author_counters(chunk_size):
+    for pks in _chunks(User.objects.all(), chunk_size):
+        AuthorStat.objects.bulk_create(
+            [AuthorStat(author_id=pk) for pk in pks],
+            ignore_conflicts=True
+        )
+    return (
+        _reconcile(AuthorStat, 'posts_count', Post, 'author_id',
+                   chunk_size)
+        + _reconcile(AuthorStat, 'followers_count', Follow, 'author_id',
+                     chunk_size)
+    )
+
+
+def rebuild_group_counters(chunk_size):
+    return _reconcile(Group, 'posts_count', Post, 'group_id', chunk_size)
+
+
+def rebuild_comment_counters(chunk_size):
+    return _reconcile(Post, 'comments_count', Comment, 'post_id',
+                      chunk_size)
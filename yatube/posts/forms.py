@@ -1,6 +1,7 @@
 from django import forms
 
 from .models import Post, Comment
+from .tasks import check_pixels
 
 
 class PostForm(forms.ModelForm):
@@ -8,6 +9,14 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        # forms.ImageField кладет в .image картинку, открытую только
+        # по заголовку; у уже сохраненной картинки его нет.
+        if image and hasattr(image, 'image'):
+            check_pixels(image.image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,140 @@
+"""Миниатюры для уже существующих постов с картинками.
+
+Посты обходятся по возрастанию id порциями в пуле процессов (по
+умолчанию на всех ядрах). Порции читаются из базы по ходу работы
+(pk больше последнего id), поэтому в памяти их не больше двух на
+процесс. После каждой готовой порции в файл --state пишется id,
+до которого все посты обработаны, поэтому прерванная команда при
+повторном запуске продолжает с этого места; --restart начинает
+сначала.
+"""
+import itertools
+import json
+import multiprocessing
+import os
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+
+def _init_worker():
+    django.setup()
+
+
+def _generate(chunk):
+    """Миниатюры порции [(id, картинка), ...]; возвращает последний id
+    порции и картинки, для которых миниатюру создать не удалось."""
+    failed = []
+    for post_id, image in chunk:
+        try:
+            thumbnails = generate_thumbnails(image)
+        except Exception as error:
+            failed.append((post_id, image, str(error)))
+            continue
+        # Непрочитанную картинку sorl только пишет в лог.
+        if not all(thumbnail.exists() for thumbnail in thumbnails.values()):
+            failed.append((post_id, image, 'миниатюра не создана'))
+    return chunk[-1][0], len(chunk), failed
+
+
+def _chunks(done_up_to, size):
+    """Порции [(id, картинка), ...] постов с картинками после
+    done_up_to, каждая — отдельным запросом по pk."""
+    posts = Post.objects.exclude(image='').order_by('pk')
+    while True:
+        chunk = list(posts.filter(pk__gt=done_up_to)
+                     .values_list('pk', 'image')[:size])
+        if not chunk:
+            return
+        yield chunk
+        done_up_to = chunk[-1][0]
+
+
+class Command(BaseCommand):
+    help = 'Создает миниатюры картинок существующих постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help='Число процессов; 1 — все в текущем процессе.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=20,
+            help='Сколько постов обрабатывает одна задача пула.'
+        )
+        parser.add_argument(
+            '--state',
+            default=os.path.join(
+                settings.BASE_DIR, 'backfill_thumbnails.json'),
+            help='Файл с местом, где остановилась команда.'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать сначала, не глядя на файл --state.'
+        )
+
+    def handle(self, *args, **options):
+        state_path = options['state']
+        done_up_to = 0
+        if not options['restart'] and os.path.exists(state_path):
+            with open(state_path) as state_file:
+                done_up_to = json.load(state_file)['done_up_to']
+            self.stdout.write(f'продолжение после поста {done_up_to}')
+
+        total = Post.objects.filter(
+            pk__gt=done_up_to).exclude(image='').count()
+        chunks = _chunks(done_up_to, options['chunk_size'])
+        self.stdout.write(f'постов с картинками: {total}')
+        if not total:
+            self.stdout.write('готово: миниатюры создавать не для чего')
+            return
+
+        workers = options['workers']
+        if workers <= 1:
+            self.collect(map(_generate, chunks), total, state_path)
+            return
+        # Процессы пула не должны наследовать открытые соединения.
+        connections.close_all()
+        with multiprocessing.Pool(workers, _init_worker) as pool:
+            # Порции отдаются пулу окнами по два на процесс: imap сам
+            # вычитал бы их все сразу. imap отдает порции по порядку:
+            # записанный id означает, что все посты до него обработаны.
+            windows = iter(lambda: list(
+                itertools.islice(chunks, workers * 2)), [])
+            results = itertools.chain.from_iterable(
+                pool.imap(_generate, window) for window in windows)
+            self.collect(results, total, state_path)
+
+    def collect(self, results, total, state_path):
+        start = time.monotonic()
+        processed = 0
+        failed = []
+        for last_id, count, chunk_failed in results:
+            processed += count
+            failed.extend(chunk_failed)
+            with open(state_path, 'w') as state_file:
+                json.dump({'done_up_to': last_id}, state_file)
+            elapsed = time.monotonic() - start
+            rate = processed / elapsed if elapsed else 0
+            # Посты, добавленные после подсчета, тоже обрабатываются.
+            total = max(total, processed)
+            left = (total - processed) / rate if rate else 0
+            self.stdout.write(
+                f'{processed} из {total} ({processed / total:.0%}), '
+                f'{rate:.1f} постов/с, осталось ~{left:.0f} с, '
+                f'ошибок {len(failed)}'
+            )
+        for post_id, image, error in failed:
+            self.stderr.write(f'пост {post_id} ({image}): {error}')
+        self.stdout.write(f'готово: {processed}, ошибок {len(failed)}')
@@ -0,0 +1,352 @@
+"""Синтетические данные для нагрузочного тестирования.
+
+Пользователи и сообщества создаются в основном процессе, подписки,
+посты и комментарии — порциями bulk_create в пуле процессов. Активность
+распределена неравномерно: немногие авторы собирают большую часть
+подписчиков и пишут большую часть постов, посты выходят сериями,
+комментарии собираются под популярными постами.
+
+bulk_create не вызывает сигналы, поэтому после загрузки команда
+пересчитывает счетчики и ленты подписок.
+"""
+import io
+import multiprocessing
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from PIL import Image
+
+from core.cache_tags import invalidate_tags
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import POSTS_TAG
+
+# Чем больше показатель, тем сильнее выборка тянется к началу списка:
+# плотность вероятности ранга r убывает как r ** (1 / SKEW - 1).
+FOLLOW_SKEW = 3
+AUTHOR_SKEW = 3
+COMMENT_SKEW = 4
+# Доля постов в сообществах и средняя пауза между постами одной серии.
+GROUP_SHARE = 0.7
+BURST_PAUSE = 300
+COMMENT_DELAY = 3600
+SAMPLE_IMAGES = 8
+# Ограничение SQLite на число параметров в одном запросе.
+LOOKUP_CHUNK = 900
+
+# Общие для задач данные; в процессах пула их заполняет _init_worker.
+_context = {}
+
+
+def _skewed(size, rng, skew):
+    """Индекс в [0, size) со степенным перекосом к началу."""
+    return min(int(size * rng.random() ** skew), size - 1)
+
+
+def _scatter(index, size):
+    """Перемешивает ранги, чтобы популярные посты не шли подряд."""
+    return index * 2654435761 % size
+
+
+@contextmanager
+def _explicit_dates(*fields):
+    """Отключает auto_now/auto_now_add, чтобы сохранить заданные даты."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field, _, _ in saved:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _init_worker(context):
+    django.setup()
+    _context.update(context)
+
+
+def _generate_follows(users, seed):
+    rng = random.Random(seed)
+    authors = _context['authors']
+    max_follows = _context['max_follows']
+    follows = []
+    for user_id in users:
+        count = min(int(rng.paretovariate(1.2)), max_follows)
+        targets = {
+            authors[_skewed(len(authors), rng, FOLLOW_SKEW)]
+            for _ in range(count)
+        }
+        targets.discard(user_id)
+        follows.extend(
+            Follow(user_id=user_id, author_id=author_id)
+            for author_id in targets
+        )
+    return follows
+
+
+def _generate_posts(count, seed):
+    rng = random.Random(seed)
+    authors = _context['authors']
+    groups = _context['groups']
+    images = _context['images']
+    period = _context['days'] * 24 * 3600
+    now = timezone.now()
+    posts = []
+    while len(posts) < count:
+        # Серия постов одного автора с короткими паузами.
+        author_id = authors[_skewed(len(authors), rng, AUTHOR_SKEW)]
+        moment = now - timedelta(seconds=rng.uniform(0, period))
+        for _ in range(min(int(rng.paretovariate(1.5)), count - len(posts))):
+            moment = min(
+                moment + timedelta(seconds=rng.expovariate(1 / BURST_PAUSE)),
+                now
+            )
+            group_id = (rng.choice(groups)
+                        if groups and rng.random() < GROUP_SHARE else None)
+            image = (rng.choice(images)
+                     if images and rng.random() < _context['image_share']
+                     else '')
+            posts.append(Post(
+                text=f'Пост {rng.getrandbits(64):016x} ' * rng.randint(1, 20),
+                author_id=author_id,
+                group_id=group_id,
+                image=image,
+                pub_date=moment,
+                updated=moment,
+            ))
+    return posts
+
+
+def _generate_comments(count, seed):
+    rng = random.Random(seed)
+    users = _context['users']
+    first_post, posts_total = _context['posts']
+    now = timezone.now()
+    post_ids = [
+        first_post + _scatter(_skewed(posts_total, rng, COMMENT_SKEW),
+                              posts_total)
+        for _ in range(count)
+    ]
+    dates = {}
+    unique_ids = list(set(post_ids))
+    for start in range(0, len(unique_ids), LOOKUP_CHUNK):
+        dates.update(
+            Post.objects.filter(
+                pk__in=unique_ids[start:start + LOOKUP_CHUNK]
+            ).values_list('pk', 'pub_date')
+        )
+    comments = [
+        Comment(
+            post_id=post_id,
+            author_id=rng.choice(users),
+            text=f'Комментарий {rng.getrandbits(32):08x}',
+            created=min(
+                dates[post_id]
+                + timedelta(seconds=rng.expovariate(1 / COMMENT_DELAY)),
+                now
+            ),
+        )
+        for post_id in post_ids
+        if post_id in dates
+    ]
+    return comments
+
+
+# Вид строк: генератор, модель и поля с явно заданными датами.
+TASKS = {
+    'follows': (_generate_follows, Follow, ()),
+    'posts': (_generate_posts, Post, ('pub_date', 'updated')),
+    'comments': (_generate_comments, Comment, ('created',)),
+}
+
+
+def _insert(kind, objs):
+    _, model, dates = TASKS[kind]
+    with _explicit_dates(*map(model._meta.get_field, dates)):
+        with transaction.atomic():
+            model.objects.bulk_create(objs, ignore_conflicts=True)
+    return len(objs)
+
+
+def _run_task(task):
+    """Строит порцию строк и сохраняет ее, если процессу разрешена запись.
+
+    Иначе строки возвращаются основному процессу: SQLite допускает
+    одного писателя, и параллельные транзакции только ждали бы друг друга.
+    """
+    kind, payload, seed = task
+    objs = TASKS[kind][0](payload, seed)
+    if _context['insert']:
+        return kind, _insert(kind, objs)
+    return kind, objs
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу пользователями, сообществами, подписками, '
+            'постами и комментариями для нагрузочного тестирования.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--max-follows',
+            type=int,
+            default=500,
+            help='Предел подписок одного пользователя.'
+        )
+        parser.add_argument(
+            '--images',
+            type=float,
+            default=0,
+            help='Доля постов с картинкой, от 0 до 1.'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='За сколько последних дней распределить посты.'
+        )
+        parser.add_argument(
+            '--password',
+            default='password',
+            help='Общий пароль созданных пользователей.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help='Число процессов; 1 — все в текущем процессе.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк создает одна задача пула.'
+        )
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        # С --seed повторный запуск дает те же данные, включая имена.
+        prefix = f'gen{rng.getrandbits(24):06x}_'
+
+        users = self.create_users(prefix, options)
+        groups = self.create_groups(prefix, options)
+        # Порядок авторов задает их популярность.
+        authors = users[:]
+        rng.shuffle(authors)
+        images = (self.create_images(prefix, rng)
+                  if options['images'] > 0 else [])
+        context = {
+            'users': users,
+            'authors': authors,
+            'groups': groups,
+            'images': images,
+            'image_share': options['images'],
+            'max_follows': options['max_follows'],
+            'days': options['days'],
+        }
+
+        follow_tasks = [
+            ('follows', users[start:start + batch_size], rng.random())
+            for start in range(0, len(users), batch_size)
+        ]
+        self.run(follow_tasks, context, options['workers'])
+
+        last_post = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        self.run(self.split('posts', options['posts'], batch_size, rng),
+                 context, options['workers'])
+        posts = Post.objects.filter(pk__gt=last_post)
+        first_post = posts.order_by('pk').values_list(
+            'pk', flat=True).first()
+        if first_post is not None and options['comments']:
+            context['posts'] = (first_post, posts.count())
+            self.run(
+                self.split('comments', options['comments'], batch_size, rng),
+                context,
+                options['workers']
+            )
+
+        self.stdout.write('пересчет счетчиков и лент подписок')
+        call_command('rebuild_counters', stdout=self.stdout)
+        call_command('rebuild_timelines', stdout=self.stdout)
+        invalidate_tags(POSTS_TAG)
+
+    def split(self, kind, total, batch_size, rng):
+        return [
+            (kind, min(batch_size, total - start), rng.random())
+            for start in range(0, total, batch_size)
+        ]
+
+    def run(self, tasks, context, workers):
+        context['insert'] = connection.vendor != 'sqlite'
+        if workers <= 1:
+            _context.update(context)
+            self.collect(map(_run_task, tasks))
+            return
+
+        # Процессы пула не должны наследовать открытые соединения.
+        connections.close_all()
+        with multiprocessing.Pool(
+                workers, _init_worker, (context,)) as pool:
+            self.collect(pool.imap_unordered(_run_task, tasks))
+
+    def collect(self, results):
+        created = 0
+        for kind, result in results:
+            if isinstance(result, list):
+                result = _insert(kind, result)
+            created += result
+            self.progress(kind, created)
+
+    def progress(self, kind, created):
+        self.stdout.write(f'{kind}: создано {created}')
+
+    def create_users(self, prefix, options):
+        password = make_password(options['password'])
+        User.objects.bulk_create(
+            (User(username=f'{prefix}{i}', password=password)
+             for i in range(options['users']))
+        )
+        users = list(User.objects.filter(
+            username__startswith=prefix).values_list('pk', flat=True))
+        self.progress('users', len(users))
+        return users
+
+    def create_groups(self, prefix, options):
+        Group.objects.bulk_create(
+            Group(
+                title=f'Сообщество {prefix}{i}',
+                slug=f'{prefix}{i}',
+                description='Сгенерированное сообщество',
+            )
+            for i in range(options['groups'])
+        )
+        groups = list(Group.objects.filter(
+            slug__startswith=prefix).values_list('pk', flat=True))
+        self.progress('groups', len(groups))
+        return groups
+
+    def create_images(self, prefix, rng):
+        """Несколько картинок на все посты: файлы не плодятся."""
+        images = []
+        for i in range(SAMPLE_IMAGES):
+            color = tuple(rng.randrange(256) for _ in range(3))
+            buffer = io.BytesIO()
+            Image.new('RGB', (1280, 720), color).save(buffer, 'JPEG')
+            images.append(default_storage.save(
+                f'posts/{prefix}{i}.jpg', ContentFile(buffer.getvalue())))
+        return images
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики постов и комментариев порциями.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Сколько строк сверять в одной транзакции.'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        rebuilds = (
+            ('авторы', counters.rebuild_author_counters),
+            ('сообщества', counters.rebuild_group_counters),
+            ('комментарии', counters.rebuild_comment_counters),
+        )
+        for name, rebuild in rebuilds:
+            fixed = rebuild(chunk_size)
+            self.stdout.write(f'{name}: исправлено счетчиков {fixed}')
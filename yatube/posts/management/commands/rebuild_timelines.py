@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timelines
+from posts.models import Follow
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок читателей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='id читателя; без параметра пересобираются все ленты.'
+        )
+
+    def handle(self, *args, **options):
+        users = options['users'] or (
+            Follow.objects.order_by('user_id')
+            .values_list('user_id', flat=True).distinct()
+        )
+        rebuilt = 0
+        for user_id in users:
+            with transaction.atomic():
+                timelines.rebuild(user_id)
+            rebuilt += 1
+        self.stdout.write(f'пересобрано лент: {rebuilt}')
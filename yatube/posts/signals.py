@@ -0,0 +1,128 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import caching, counters, tasks, timelines
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Поля, которые видны в карточках постов.
+AUTHOR_CARD_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+# Кеш сбрасывается раньше счетчиков: нужна прежняя группа поста.
+@receiver(post_save, sender=Post)
+def invalidate_saved_post(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old_group_id = getattr(instance, '_loaded_values', {}).get('group_id')
+    caching.invalidate_post(instance, old_group_id)
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    caching.invalidate_post(instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_renamed_author(sender, instance, created, raw=False,
+                              update_fields=None, **kwargs):
+    # Вход сохраняет только last_login: ленты при этом не сбрасываются.
+    if created or raw or (
+            update_fields is not None
+            and not AUTHOR_CARD_FIELDS & set(update_fields)):
+        return
+    caching.invalidate_related(author_id=instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def invalidate_renamed_group(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        caching.invalidate_related(group_id=instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, raw=False, **kwargs):
+    if not raw:
+        caching.invalidate_follow(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        caching.invalidate_comments(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    if created:
+        counters.shift_author_posts(instance.author_id, 1)
+        counters.shift_group_posts(instance.group_id, 1)
+        timelines.fan_out(instance)
+    elif 'group_id' in loaded and loaded['group_id'] != instance.group_id:
+        counters.shift_group_posts(loaded['group_id'], -1)
+        counters.shift_group_posts(instance.group_id, 1)
+    instance._loaded_values = {**loaded, 'group_id': instance.group_id}
+
+
+@receiver(post_save, sender=Post)
+def process_new_image(sender, instance, created, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    if created or loaded.get('image') != instance.image.name:
+        tasks.schedule_image(instance)
+    instance._loaded_values = {**loaded, 'image': instance.image.name}
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.shift_author_posts(instance.author_id, -1)
+    counters.shift_group_posts(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.shift_post_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.shift_post_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.shift_author_followers(instance.author_id, 1)
+        timelines.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    # Сравниваются значения до и после своего вычитания: при
+    # одновременных отписках счетчик может перескочить порог, а
+    # повторная раскладка ничего не дублирует.
+    before = timelines.followers_count(instance.author_id)
+    counters.shift_author_followers(instance.author_id, -1)
+    timelines.prune(instance.user_id, instance.author_id)
+    after = timelines.followers_count(instance.author_id)
+    if before > settings.TIMELINE_FANOUT_LIMIT >= after:
+        # Раскладка постов сотням подписчиков не должна задерживать
+        # отписку того, кто опустил автора до порога.
+        tasks.defer(backfill_followers, instance.author_id)
+
+
+def backfill_followers(author_id):
+    """Раскладывает посты автора, опустившегося до порога fan-out,
+    по лентам подписчиков и сбрасывает их закешированные ленты."""
+    timelines.backfill_followers(author_id)
+    caching.invalidate_followers(author_id)
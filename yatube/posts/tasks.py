@@ -0,0 +1,151 @@
+"""Работа вне запроса: фоновые задачи после коммита и картинки постов.
+
+После сохранения поста с новой картинкой фоновый поток (после коммита
+транзакции) нормализует картинку: поворачивает ее по EXIF, уменьшает
+до POST_IMAGE_MAX_SIZE и пересжимает без метаданных. Затем создаются
+миниатюры, поэтому за декодирование, обрезку и сжатие не платит первый
+читатель, а шаблон находит миниатюры уже готовыми. Существующие посты
+обрабатывает команда backfill_thumbnails.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from . import caching
+from .models import Post
+from .thumbnails import generate_thumbnails
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def check_pixels(picture):
+    """Отклоняет картинку больше POST_IMAGE_MAX_PIXELS по заголовку,
+    до декодирования: маленький файл может распаковаться в гигабайты."""
+    width, height = picture.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f'Картинка {width}x{height} слишком большая: допустимо не '
+            f'больше {settings.POST_IMAGE_MAX_PIXELS} пикселей.',
+            code='too_many_pixels',
+        )
+
+
+def _encoder_options(image_format):
+    quality = settings.POST_IMAGE_QUALITY
+    return {
+        'JPEG': {'quality': quality, 'optimize': True, 'progressive': True},
+        'PNG': {'optimize': True},
+        'WEBP': {'quality': quality},
+        'GIF': {},
+    }.get(image_format)
+
+
+def normalize_image(image):
+    """Пересжимает картинку поста в новый файл; возвращает его имя.
+
+    Исходный файл не трогается: его удаляет process_image, когда
+    пост уже ссылается на новый. Формат сохраняется. EXIF и прочие
+    метаданные не переносятся, остается только цветовой профиль.
+    Анимации и форматы, которые не умеем пересжимать, остаются как есть.
+    """
+    storage = image.storage
+    with storage.open(image.name) as source:
+        picture = Image.open(source)
+        check_pixels(picture)
+        image_format = picture.format
+        options = _encoder_options(image_format)
+        if options is None or getattr(picture, 'is_animated', False):
+            return image.name
+        icc_profile = picture.info.get('icc_profile')
+        picture = ImageOps.exif_transpose(picture)
+        picture.thumbnail(settings.POST_IMAGE_MAX_SIZE, Image.LANCZOS)
+        output = BytesIO()
+        if icc_profile:
+            options = {**options, 'icc_profile': icc_profile}
+        picture.save(output, image_format, **options)
+
+    # Имя занято исходным файлом, поэтому хранилище даст новое.
+    return storage.save(image.name, ContentFile(output.getvalue()))
+
+
+def process_image(post_id):
+    """Нормализует картинку поста и заново создает ее миниатюры.
+
+    Пост переключается на новый файл до удаления старого, поэтому
+    картинка доступна все время. Обновление условное: если за время
+    обработки картинку поста сменили, запись не затирается, а новый
+    файл удаляется. Иначе пост обновляется всегда, и его карточки,
+    отрисованные до появления миниатюр, сбрасываются.
+    """
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    old_name = post.image.name
+    name = normalize_image(post.image)
+    matched = Post.objects.filter(pk=post.pk, image=old_name).update(
+        image=name, updated=timezone.now())
+    if not matched:
+        if name != old_name:
+            post.image.storage.delete(name)
+        return
+    # update() не шлет сигналов, поэтому кеш сбрасывается здесь,
+    # а задача заново не ставится.
+    caching.invalidate_post(post)
+    post.image.name = name
+    if name != old_name:
+        # Вместе с записью kvstore удаляются и миниатюры старого файла.
+        default.kvstore.delete(ImageFile(old_name, post.image.storage))
+        post.image.storage.delete(old_name)
+    generate_thumbnails(post.image)
+
+
+def _call(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s%r упала', func.__name__, args)
+
+
+def _run(func, args):
+    try:
+        _call(func, args)
+    finally:
+        # Соединения потоков пула сами не закрываются.
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            settings.BACKGROUND_WORKERS, thread_name_prefix='tasks')
+    return _executor
+
+
+def defer(func, *args):
+    """Выполняет func(*args) в фоновом потоке после коммита транзакции.
+
+    Задача видит закоммиченные данные и не задерживает ответ; если
+    транзакция откатится, задача не запустится. При BACKGROUND_WORKERS
+    = 0 задача выполняется после коммита в том же потоке.
+    """
+    if not settings.BACKGROUND_WORKERS:
+        transaction.on_commit(lambda: _call(func, args))
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run, func, args))
+
+
+def schedule_image(post):
+    """Обрабатывает картинку поста в фоне после коммита транзакции."""
+    defer(process_image, post.pk)
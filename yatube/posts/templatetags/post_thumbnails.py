@@ -0,0 +1,22 @@
+"""Миниатюры картинок постов в шаблонах (см. posts.thumbnails)."""
+from django import template
+
+from ..thumbnails import thumbnail_urls
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_thumbnails(context, post):
+    """`{% post_thumbnails post as thumbnails %}` — {вариант: адрес}.
+
+    Адреса постов страницы ищутся все вместе через page_thumbnails
+    (posts.thumbnails.PageThumbnails) из контекста, если он есть.
+    """
+    if not post.image:
+        return {}
+    page = context.get('page_thumbnails')
+    urls = page.get(post) if page is not None else None
+    if urls is None:
+        urls = thumbnail_urls([post.image])[post.image.name]
+    return urls
@@ -0,0 +1,208 @@
+import json
+import os
+import time
+import unittest
+import warnings
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from core.loadtesting import percentile
+from posts import urls as posts_urls
+from users import urls as users_urls
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Время ответа зависит от машины, поэтому падает только бюджет запросов.
+# Замеры времени включает PERF_BASELINE — путь к файлу базы вне
+# репозитория: первый прогон записывает базу, следующие сообщают
+# предупреждением о заметном росте p95. PERF_BASELINE_UPDATE=1
+# перезаписывает базу после осознанных изменений.
+BASELINE_PATH = os.environ.get('PERF_BASELINE')
+UPDATE_BASELINE = os.environ.get('PERF_BASELINE_UPDATE') == '1'
+# Во сколько раз p95 может превысить базу без предупреждения
+# и абсолютный запас на шум коротких запросов.
+LATENCY_TOLERANCE = 2.0
+LATENCY_SLACK = 0.005
+LATENCY_RUNS = 15
+
+PAGE_SIZES = (5, 20)
+
+# Предельное число запросов на холодном кеше. Запросы сессии
+# и пользователя входят в бюджет. Сами числа не должны зависеть
+# ни от размера страницы, ни от объема данных.
+QUERY_BUDGETS = {
+    'posts:main-view': 4,
+    'posts:groups_list': 3,
+    'posts:group_posts': 5,
+    'posts:profile': 6,
+    'posts:post_detail': 4,
+    'posts:post_comments': 2,
+    'posts:post_create': 3,
+    'posts:post_edit': 4,
+    'posts:add_comment': 3,
+    'posts:follow_index': 5,
+    'posts:profile_follow': 16,
+    'posts:profile_unfollow': 9,
+    'users:logout': 4,
+    'users:login': 2,
+    'users:password_change_done': 2,
+    'users:password_change': 2,
+    'users:password_reset_complete': 2,
+    'users:password_reset_confirm': 5,
+    'users:password_reset_done': 2,
+    'users:password_reset': 2,
+    'users:signup': 2,
+}
+
+
+def _url_names(module):
+    return [
+        f'{module.app_name}:{pattern.name}'
+        for pattern in module.urlpatterns
+    ]
+
+
+class BudgetMixin:
+    """Прогоняет каждый адрес posts.urls и users.urls через клиент.
+
+    Подклассы задают объем данных: POSTS постов автора в группе,
+    у каждого по COMMENTS комментариев разных пользователей.
+    """
+    POSTS = None
+    COMMENTS = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@yatube.ru')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        commentators = [
+            User.objects.create_user(username=f'commentator{i}')
+            for i in range(cls.COMMENTS)
+        ]
+        for i in range(cls.POSTS):
+            post = Post.objects.create(
+                text=f'{i} тестовый пост, содержащий более 15 символов',
+                author=cls.author,
+                group=cls.group,
+            )
+            for commentator in commentators:
+                Comment.objects.create(
+                    post=post, author=commentator, text='комментарий')
+        cls.post = post
+        cls.stranger = User.objects.create_user(username='stranger')
+
+    def url_for(self, name):
+        post_args = [self.post.pk]
+        args = {
+            'posts:group_posts': [self.group.slug],
+            'posts:profile': [self.author.username],
+            'posts:post_detail': post_args,
+            'posts:post_comments': post_args,
+            'posts:post_edit': post_args,
+            'posts:add_comment': post_args,
+            'posts:profile_follow': [self.stranger.username],
+            'posts:profile_unfollow': [self.author.username],
+            'users:password_reset_confirm': [
+                urlsafe_base64_encode(force_bytes(self.reader.pk)),
+                default_token_generator.make_token(self.reader),
+            ],
+        }
+        return reverse(name, args=args.get(name, []))
+
+    def get(self, name):
+        """Запрос читателя на холодном кеше; возвращает число запросов
+        к базе и время ответа."""
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        client = Client()
+        client.force_login(self.reader)
+        url = self.url_for(name)
+        # Подписки и выход меняют данные: откатываем их после запроса,
+        # чтобы все прогоны видели одно и то же состояние.
+        savepoint = transaction.savepoint()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - start
+        transaction.savepoint_rollback(savepoint)
+        self.assertLess(response.status_code, 400, url)
+        return len(queries), elapsed
+
+    def all_url_names(self):
+        return _url_names(posts_urls) + _url_names(users_urls)
+
+    def test_every_view_has_budget(self):
+        """Проверка: у каждого адреса posts и users есть бюджет."""
+        self.assertCountEqual(self.all_url_names(), QUERY_BUDGETS)
+
+    def test_query_count_within_budget(self):
+        """Проверка: число запросов в бюджете и не растет со страницей."""
+        for name in self.all_url_names():
+            with self.subTest(view=name):
+                counts = set()
+                for page_size in PAGE_SIZES:
+                    with override_settings(
+                            PAGE_SIZE=page_size,
+                            COMMENTS_PAGE_SIZE=page_size):
+                        count, _ = self.get(name)
+                    counts.add(count)
+                self.assertEqual(len(counts), 1, counts)
+                self.assertLessEqual(counts.pop(), QUERY_BUDGETS[name])
+
+
+class SmallDatasetBudgetTests(BudgetMixin, TestCase):
+    POSTS = 3
+    COMMENTS = 2
+
+
+class LargeDatasetBudgetTests(BudgetMixin, TestCase):
+    POSTS = 45
+    COMMENTS = 25
+
+    @unittest.skipUnless(BASELINE_PATH, 'PERF_BASELINE не задан')
+    def test_latency_against_baseline(self):
+        """Проверка: p95 времени ответа сравнивается с записанной базой."""
+        measured = {}
+        for name in self.all_url_names():
+            timings = [self.get(name)[1] for _ in range(LATENCY_RUNS)]
+            measured[name] = {
+                'p50': percentile(timings, 50),
+                'p95': percentile(timings, 95),
+                'p99': percentile(timings, 99),
+            }
+
+        if UPDATE_BASELINE or not os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH, 'w') as baseline_file:
+                json.dump(measured, baseline_file, indent=2, sort_keys=True)
+            return
+
+        with open(BASELINE_PATH) as baseline_file:
+            baseline = json.load(baseline_file)
+        for name, timings in measured.items():
+            if name not in baseline:
+                continue
+            allowed = (baseline[name]['p95'] * LATENCY_TOLERANCE
+                       + LATENCY_SLACK)
+            if timings['p95'] > allowed:
+                warnings.warn(
+                    f'{name}: p95 {timings["p95"] * 1000:.1f} мс, '
+                    f'база {baseline[name]["p95"] * 1000:.1f} мс'
+                )
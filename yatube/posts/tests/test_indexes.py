@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post
+from ..timelines import follow_feed
+from ..utils import CursorPaginator
+
+User = get_user_model()
+
+
+class QueryPlanTests(TestCase):
+    """Основные запросы представлений читают индекс, а не сортируют."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.author = User.objects.create_user(username='AuthorUser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author, text='Тестовый пост', group=cls.group)
+        Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий')
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+    def assertUsesIndex(self, queryset):
+        plan = self.query_plan(queryset)
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertIn('INDEX', plan)
+
+    def test_feed_queries_use_indexes(self):
+        """Проверка: ленты выбираются по индексу без сортировки."""
+        size = settings.PAGE_SIZE
+        feeds = {
+            'index': Post.objects.select_related('group', 'author'),
+            'group_posts': self.group.posts.select_related(
+                'group', 'author'),
+            'profile': self.author.posts.select_related('group'),
+            'follow_index': follow_feed(self.user),
+        }
+        for name, posts in feeds.items():
+            with self.subTest(view=name):
+                self.assertUsesIndex(posts[:size])
+            with self.subTest(view=name, mode='cursor'):
+                paginator = CursorPaginator(posts, size)
+                self.assertUsesIndex(paginator._older(
+                    self.post.pub_date, self.post.pk)[:size + 1])
+
+    def test_comments_query_uses_index(self):
+        """Проверка: комментарии поста выбираются по индексу."""
+        self.assertUsesIndex(self.post.comments.all())
+
+    def test_follow_check_uses_index(self):
+        """Проверка: проверка подписки идет по уникальному индексу."""
+        self.assertUsesIndex(
+            Follow.objects.filter(user=self.user, author=self.author))
@@ -1,7 +1,13 @@
+from datetime import timedelta
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import (
+    AuthorStat, Comment, Follow, Group, Post, TimelineEntry
+)
 
 User = get_user_model()
 
@@ -45,3 +51,134 @@ class PostModelTest(TestCase):
             str(self.post),
             self.POST_TITLE[:self.DESCR_CHARS_COUNT]
         )
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='tst_slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_slug',
+            description='Тестовое описание',
+        )
+
+    def counts(self):
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        stat = AuthorStat.objects.filter(author=self.user).first()
+        return (
+            stat.posts_count if stat else 0,
+            self.group.posts_count,
+            self.other_group.posts_count,
+        )
+
+    def test_post_counters(self):
+        """Проверка счетчиков постов при создании, смене группы, удалении."""
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост', group=self.group)
+        self.assertEqual(self.counts(), (1, 1, 0))
+
+        post = Post.objects.get(pk=post.pk)
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(self.counts(), (1, 0, 1))
+
+        post.save()
+        self.assertEqual(self.counts(), (1, 0, 1))
+
+        post.delete()
+        self.assertEqual(self.counts(), (0, 0, 0))
+
+    def test_comment_counter(self):
+        """Проверка счетчика комментариев поста."""
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Комментарий')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_rebuild_counters(self):
+        """Проверка: команда rebuild_counters исправляет расхождения."""
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост', group=self.group)
+        Comment.objects.create(post=post, author=self.user, text='Текст')
+        Group.objects.update(posts_count=7)
+        Post.objects.update(comments_count=0)
+        AuthorStat.objects.all().delete()
+
+        call_command('rebuild_counters', chunk_size=1, stdout=StringIO())
+
+        post.refresh_from_db()
+        self.assertEqual(self.counts(), (1, 1, 0))
+        self.assertEqual(post.comments_count, 1)
+
+
+class GenerateDataTest(TestCase):
+    def test_generate_data(self):
+        """Проверка: generate_data создает согласованные данные."""
+        call_command(
+            'generate_data',
+            users=30,
+            groups=3,
+            posts=200,
+            comments=300,
+            workers=1,
+            batch_size=50,
+            seed=1,
+            stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Follow.objects.exists())
+
+        # Даты постов разнесены по времени, а не равны моменту загрузки.
+        dates = Post.objects.values_list('pub_date', flat=True)
+        self.assertGreater(max(dates) - min(dates), timedelta(days=1))
+        comment = Comment.objects.select_related('post').first()
+        self.assertGreaterEqual(comment.created, comment.post.pub_date)
+
+        # Счетчики и ленты пересчитаны после bulk_create.
+        stat = AuthorStat.objects.order_by('-posts_count').first()
+        self.assertEqual(
+            stat.posts_count,
+            Post.objects.filter(author_id=stat.author_id).count()
+        )
+        follow = Follow.objects.first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user_id=follow.user_id,
+                post__author_id=follow.author_id
+            ).count(),
+            Post.objects.filter(author_id=follow.author_id).count()
+        )
+
+    def test_seed_repeats_data(self):
+        """Проверка: с одним --seed данные повторяются."""
+        def generate():
+            call_command(
+                'generate_data', users=10, groups=2, posts=30, comments=30,
+                workers=1, batch_size=10, seed=7, stdout=StringIO(),
+            )
+            data = (
+                sorted(User.objects.values_list('username', flat=True)),
+                sorted(Post.objects.values_list('text', flat=True)),
+                sorted(Comment.objects.values_list('text', flat=True)),
+            )
+            User.objects.all().delete()
+            Group.objects.all().delete()
+            return data
+
+        self.assertEqual(generate(), generate())
@@ -0,0 +1,318 @@
+import json
+import os
+import tempfile
+from io import BytesIO, StringIO
+from shutil import rmtree
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from core.cache_tags import tag_versions
+
+from .. import tasks
+from ..caching import post_tag
+from ..forms import PostForm
+from ..models import Post
+from ..thumbnails import generate_thumbnails, thumbnail_urls
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def uploaded(name, content=SMALL_GIF):
+    return SimpleUploadedFile(
+        name=name, content=content, content_type='image/gif')
+
+
+def camera_jpeg():
+    """JPEG 40x20, который по EXIF нужно повернуть на 90° по часовой."""
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation
+    exif[0x010F] = 'Камера'  # Make
+    output = BytesIO()
+    Image.new('RGB', (40, 20), 'red').save(
+        output, 'JPEG', quality=100, exif=exif.tobytes())
+    return output.getvalue()
+
+
+# Размер миниатюры равен картинке 2x1, масштабировать ничего не нужно.
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POST_THUMBNAIL_GEOMETRY='2x1',
+    POST_THUMBNAIL_OPTIONS={'crop': 'center', 'upscale': False},
+)
+class ThumbnailTasksTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='TestUser')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        rmtree(os.path.join(TEMP_MEDIA_ROOT, 'cache'), ignore_errors=True)
+        self.state = os.path.join(TEMP_MEDIA_ROOT, f'{self.id()}.json')
+
+    def thumbnails(self):
+        return sum(
+            len(files)
+            for _, _, files in os.walk(os.path.join(TEMP_MEDIA_ROOT, 'cache'))
+        )
+
+    def backfill(self, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'backfill_thumbnails', '--workers=1', '--chunk-size=1',
+            f'--state={self.state}', *args, stdout=stdout, stderr=stderr,
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_scheduled_on_new_image(self):
+        """Проверка: миниатюра ставится в очередь после коммита только
+        для нового поста с картинкой и при смене картинки."""
+        scheduled = len(connection.run_on_commit)
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=uploaded('new.gif'))
+        self.assertEqual(len(connection.run_on_commit), scheduled + 1)
+
+        post = Post.objects.get(pk=post.pk)
+        post.text = 'Другой текст'
+        post.save()
+        Post.objects.create(text='Без картинки', author=self.user)
+        self.assertEqual(len(connection.run_on_commit), scheduled + 1)
+
+        post.image = uploaded('changed.gif')
+        post.save()
+        self.assertEqual(len(connection.run_on_commit), scheduled + 2)
+
+    def test_backfill_resumes(self):
+        """Проверка: backfill_thumbnails создает миниатюры, запоминает,
+        где остановилась, и продолжает с этого места."""
+        posts = [
+            Post.objects.create(
+                text=f'Пост {number}', author=self.user,
+                image=uploaded(f'backfill_{number}.gif'))
+            for number in range(3)
+        ]
+        Post.objects.create(text='Без картинки', author=self.user)
+
+        stdout, stderr = self.backfill()
+        self.assertIn('готово: 3, ошибок 0', stdout)
+        self.assertEqual(stderr, '')
+        # Основная миниатюра и WebP-вариант.
+        self.assertEqual(self.thumbnails(), 6)
+        with open(self.state) as state_file:
+            self.assertEqual(json.load(state_file),
+                             {'done_up_to': posts[-1].pk})
+
+        with open(self.state, 'w') as state_file:
+            json.dump({'done_up_to': posts[0].pk}, state_file)
+        stdout, _ = self.backfill()
+        self.assertIn(f'продолжение после поста {posts[0].pk}', stdout)
+        self.assertIn('постов с картинками: 2', stdout)
+
+        stdout, _ = self.backfill('--restart')
+        self.assertIn('постов с картинками: 3', stdout)
+
+    def test_backfill_without_images(self):
+        """Проверка: без постов с картинками команда сразу завершается."""
+        Post.objects.create(text='Без картинки', author=self.user)
+        stdout, stderr = self.backfill()
+        self.assertIn('постов с картинками: 0', stdout)
+        self.assertEqual(stderr, '')
+        self.assertFalse(os.path.exists(self.state))
+
+    def test_backfill_reports_failures(self):
+        """Проверка: посты с битой картинкой перечисляются в stderr,
+        а остальные обрабатываются."""
+        Post.objects.create(
+            text='Битая', author=self.user, image='posts/missing.gif')
+        Post.objects.create(
+            text='Целая', author=self.user, image=uploaded('whole.gif'))
+
+        stdout, stderr = self.backfill()
+        self.assertIn('ошибок 1', stdout)
+        self.assertIn('posts/missing.gif', stderr)
+        self.assertEqual(self.thumbnails(), 2)
+
+    def test_feed_thumbnails_batched(self):
+        """Проверка: адреса миниатюр карточек ленты берутся из кеша
+        одним get_many, без запросов к kvstore, а страница из кеша
+        фрагментов их не ищет."""
+        posts = [
+            Post.objects.create(
+                text=f'Пост {number}', author=self.user,
+                image=uploaded(f'feed_{number}.gif'))
+            for number in range(3)
+        ]
+        urls = [generate_thumbnails(post.image)['thumbnail'].url
+                for post in posts]
+        Post.objects.create(text='Без картинки', author=self.user)
+
+        for url in (reverse('posts:main-view'),
+                    reverse('posts:profile', args=[self.user.username])):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                lookups = [query for query in queries.captured_queries
+                           if 'thumbnail_kvstore' in query['sql']]
+                self.assertEqual(lookups, [])
+                for thumbnail_url in urls:
+                    self.assertContains(response, thumbnail_url, 1)
+                self.assertContains(response, '<img class="card-img', 3)
+                self.assertContains(response, 'type="image/webp"', 3)
+
+                response = self.client.get(url)
+                self.assertIsNone(response.context['page_thumbnails']._urls)
+
+    def test_cold_feed_thumbnails_one_kvstore_query(self):
+        """Проверка: без адресов в кеше готовые миниатюры всей страницы
+        ищутся в kvstore одним запросом и снова попадают в кеш."""
+        posts = [
+            Post.objects.create(
+                text=f'Пост {number}', author=self.user,
+                image=uploaded(f'cold_{number}.gif'))
+            for number in range(3)
+        ]
+        urls = [generate_thumbnails(post.image)['thumbnail'].url
+                for post in posts]
+        cache.clear()
+
+        url = reverse('posts:profile', args=[self.user.username])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        lookups = [query for query in queries.captured_queries
+                   if 'thumbnail_kvstore' in query['sql']]
+        self.assertEqual(len(lookups), 1)
+        for thumbnail_url in urls:
+            self.assertContains(response, thumbnail_url, 1)
+        self.assertEqual(self.thumbnails(), 6)
+
+        images = [post.image for post in posts]
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [found['thumbnail']
+                 for found in thumbnail_urls(images).values()],
+                urls
+            )
+
+    def test_feed_thumbnail_created_by_template(self):
+        """Проверка: миниатюры, которых еще нет, создает шаблон."""
+        Post.objects.create(
+            text='Пост', author=self.user, image=uploaded('fresh.gif'))
+        response = self.client.get(reverse('posts:main-view'))
+        self.assertContains(response, '<img class="card-img', 1)
+        self.assertEqual(self.thumbnails(), 2)
+
+    @override_settings(POST_THUMBNAIL_OPTIONS={
+        'crop': 'center', 'upscale': False, 'format': 'PNG'})
+    def test_template_uses_thumbnail_options(self):
+        """Проверка: шаблон создает миниатюру со всеми параметрами
+        из POST_THUMBNAIL_OPTIONS, а не только crop и upscale."""
+        Post.objects.create(
+            text='Пост', author=self.user, image=uploaded('options.gif'))
+        response = self.client.get(reverse('posts:main-view'))
+        self.assertRegex(
+            response.content.decode(), r'<img class="card-img[^>]*\.png"')
+
+    @override_settings(
+        POST_IMAGE_MAX_SIZE=(10, 10),
+        POST_THUMBNAIL_GEOMETRY='5x10',
+    )
+    def test_image_normalized(self):
+        """Проверка: картинка поворачивается по EXIF, уменьшается,
+        теряет метаданные и сохраняется новым файлом; старый файл
+        удаляется, пост сохраняется, и для картинки создаются
+        миниатюры."""
+        post = Post.objects.create(
+            text='Пост', author=self.user,
+            image=uploaded('camera.jpg', camera_jpeg()))
+        old_name, updated = post.image.name, post.updated
+        version = tag_versions(post_tag(post.pk))
+        tasks.process_image(post.pk)
+
+        post.refresh_from_db()
+        self.assertNotEqual(tag_versions(post_tag(post.pk)), version)
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertFalse(post.image.storage.exists(old_name))
+        self.assertGreater(post.updated, updated)
+        with post.image.open() as image_file:
+            picture = Image.open(image_file)
+            self.assertEqual(picture.format, 'JPEG')
+            self.assertEqual(picture.size, (5, 10))
+            self.assertEqual(dict(picture.getexif()), {})
+        self.assertEqual(self.thumbnails(), 2)
+
+    def test_unchanged_image_saves_post(self):
+        """Проверка: картинка, которую не пересжимаем, остается на месте,
+        а пост все равно сохраняется, чтобы сбросить его карточки."""
+        output = BytesIO()
+        Image.new('RGB', (2, 1)).save(output, 'BMP')
+        post = Post.objects.create(
+            text='Пост', author=self.user,
+            image=uploaded('kept.bmp', output.getvalue()))
+        old_name, updated = post.image.name, post.updated
+        tasks.process_image(post.pk)
+
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, old_name)
+        self.assertTrue(post.image.storage.exists(old_name))
+        self.assertGreater(post.updated, updated)
+
+    def test_image_changed_during_processing(self):
+        """Проверка: если картинку поста сменили, пока задача ее
+        обрабатывала, пост остается с новой картинкой, а файл задачи
+        удаляется."""
+        post = Post.objects.create(
+            text='Пост', author=self.user,
+            image=uploaded('camera.jpg', camera_jpeg()))
+        other = Post.objects.create(
+            text='Другой пост', author=self.user,
+            image=uploaded('other.gif'))
+        normalize, normalized = tasks.normalize_image, []
+
+        def normalize_and_change(image):
+            normalized.append(normalize(image))
+            Post.objects.filter(pk=post.pk).update(image=other.image.name)
+            return normalized[0]
+
+        with mock.patch.object(
+                tasks, 'normalize_image', side_effect=normalize_and_change):
+            tasks.process_image(post.pk)
+
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, other.image.name)
+        self.assertNotEqual(normalized[0], other.image.name)
+        self.assertFalse(post.image.storage.exists(normalized[0]))
+        self.assertEqual(self.thumbnails(), 0)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1)
+    def test_form_rejects_too_many_pixels(self):
+        """Проверка: форма отклоняет картинку больше
+        POST_IMAGE_MAX_PIXELS, не декодируя ее."""
+        form = PostForm(
+            data={'text': 'Пост'}, files={'image': uploaded('big.gif')})
+        self.assertFalse(form.is_valid())
+        self.assertIn('2x1', form.errors['image'][0])
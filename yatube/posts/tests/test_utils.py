@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from core.cache_tags import invalidate_tags, tag_versions
+
+from ..models import Group, Post
+from ..utils import CachedCountPaginator
+
+User = get_user_model()
+
+
+class CachedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.PAGES_COUNT = 12
+        cls.user = User.objects.create_user(username='TestUser')
+        Post.objects.bulk_create([
+            Post(text=f'{i} тестовый пост', author=cls.user)
+            for i in range(settings.PAGE_SIZE * cls.PAGES_COUNT)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_count_is_cached(self):
+        """Проверка: COUNT ленты выполняется один раз."""
+        posts = Post.objects.all()
+        CachedCountPaginator(posts, settings.PAGE_SIZE).count
+        with self.assertNumQueries(0):
+            count = CachedCountPaginator(posts, settings.PAGE_SIZE).count
+        self.assertEqual(count, Post.objects.count())
+
+    def test_count_kept_after_new_post(self):
+        """Проверка: новый пост не сбрасывает закешированный COUNT,
+        а у другой ленты свой COUNT."""
+        posts = Post.objects.all()
+        count = CachedCountPaginator(posts, settings.PAGE_SIZE).count
+        Post.objects.create(text='Новый пост', author=self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                CachedCountPaginator(posts, settings.PAGE_SIZE).count, count)
+        self.assertEqual(
+            CachedCountPaginator(
+                posts.filter(text='Новый пост'), settings.PAGE_SIZE).count,
+            1
+        )
+        # Страница не обрезается по устаревшему COUNT.
+        self.assertEqual(
+            len(CachedCountPaginator(posts, settings.PAGE_SIZE * 13).page(1)),
+            count + 1
+        )
+
+    def test_elided_page_range(self):
+        """Проверка: навигация содержит только соседние и крайние страницы."""
+        paginator = CachedCountPaginator(
+            Post.objects.all(), settings.PAGE_SIZE)
+        ellipsis = paginator.ELLIPSIS
+        self.assertEqual(
+            paginator.get_elided_page_range(6),
+            [1, ellipsis, 4, 5, 6, 7, 8, ellipsis, self.PAGES_COUNT]
+        )
+        self.assertEqual(
+            paginator.get_elided_page_range(1),
+            [1, 2, 3, ellipsis, self.PAGES_COUNT]
+        )
+
+    def test_index_uses_elided_range(self):
+        """Проверка: главная страница получает сокращенную навигацию."""
+        response = self.client.get(reverse('posts:main-view'))
+        pages = response.context['pages_count']
+        self.assertIn(self.PAGES_COUNT, pages)
+        self.assertLess(len(pages), self.PAGES_COUNT)
+
+
+class CacheTagsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+
+    def test_invalidate_only_given_tags(self):
+        """Проверка: сброс тега не меняет версии других тегов."""
+        author = tag_versions('author:1')
+        group = tag_versions('group:1')
+        invalidate_tags('author:1')
+        self.assertNotEqual(tag_versions('author:1'), author)
+        self.assertEqual(tag_versions('group:1'), group)
+
+    def test_new_post_invalidates_its_feeds(self):
+        """Проверка: новый пост сбрасывает теги своих лент."""
+        group_tag = f'group:{self.group.pk}'
+        other_tag = f'group:{self.group.pk + 1}'
+        before = tag_versions(group_tag, other_tag).split('.')
+        Post.objects.create(
+            author=self.user, text='Тестовый пост', group=self.group)
+        after = tag_versions(group_tag, other_tag).split('.')
+        self.assertNotEqual(before[0], after[0])
+        self.assertEqual(before[1], after[1])
@@ -6,12 +6,15 @@ from django.conf import settings
 from django.core.cache import cache
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from http import HTTPStatus
 from shutil import rmtree
 
 
-from ..models import Group, Post, Follow
+from .. import signals
+from ..models import Comment, Group, Post, Follow, TimelineEntry
 
 User = get_user_model()
 
@@ -222,18 +225,82 @@ class TaskPagesTemplatesTests(TestCase):
         # Берем контент главной сраницы
         init_cont = self.client.get(reverse('posts:main-view')).content
 
-        new_post.delete()
-
-        # Проверяем страницу на использование кешированных данных
+        # Изменение в обход сигналов не сбрасывает кеш
+        Post.objects.filter(pk=new_post.pk).update(text='Changed text')
         new_cont = self.client.get(reverse('posts:main-view')).content
         self.assertEqual(init_cont, new_cont)
 
-        cache.clear()
-
-        # Проверяем главную страницу
+        # Удаление поста сразу сбрасывает фрагмент
+        new_post.delete()
         new_cont = self.client.get(reverse('posts:main-view')).content
         self.assertNotEqual(init_cont, new_cont)
 
+    def test_cached_feed_edit_links_per_user(self):
+        """Проверка: общий кеш ленты не раздает чужие ссылки правки."""
+        edit_url = reverse('posts:post_edit', args=[self.post.pk])
+        other_client = Client()
+        other_client.force_login(
+            User.objects.create_user(username='OtherUser'))
+
+        response = self.authorized_client.get(reverse('posts:main-view'))
+        self.assertContains(response, edit_url)
+        response = other_client.get(reverse('posts:main-view'))
+        self.assertNotContains(response, edit_url)
+        response = self.client.get(reverse('posts:main-view'))
+        self.assertNotContains(response, edit_url)
+
+    def test_edit_invalidates_only_its_card(self):
+        """Проверка: правка поста пересобирает только его карточку."""
+        other_post = Post.objects.create(
+            author=self.user, text='Карточка другого поста')
+        self.client.get(reverse('posts:main-view'))
+
+        # Изменение в обход сигналов: версия карточки прежняя
+        Post.objects.filter(pk=other_post.pk).update(text='Новый текст')
+        self.post.text = 'Отредактированный текст поста'
+        self.post.save()
+
+        response = self.client.get(reverse('posts:main-view'))
+        self.assertContains(response, 'Отредактированный текст поста')
+        self.assertContains(response, 'Карточка другого поста')
+
+    def test_group_and_profile_cache_follow_edits(self):
+        """Проверка: правка поста видна в группе и профиле сразу."""
+        urls = (
+            reverse('posts:group_posts', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+        )
+        for url in urls:
+            self.client.get(url)
+        self.post.text = 'Отредактированный текст поста'
+        self.post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.client.get(url), 'Отредактированный текст поста')
+
+    def test_cached_cards_follow_renames(self):
+        """Проверка: новое имя автора и группы видно в лентах сразу."""
+        urls = (
+            reverse('posts:main-view'),
+            reverse('posts:group_posts', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+        )
+        for url in urls:
+            self.client.get(url)
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Новое'
+        author.last_name = 'Имя'
+        author.save()
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новая группа'
+        group.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Новое Имя')
+                self.assertContains(response, 'Новая группа')
+
 
 # Проверка паджинатора
 class PaginatorViewsTest(TestCase):
@@ -304,6 +371,118 @@ class PaginatorViewsTest(TestCase):
         self.assertEqual(
             len(response.context['page_obj']), self.OVER_PAGE_COUNT)
 
+    @override_settings(PAGINATION_MODE='cursor')
+    def test_cursor_pages_cover_feed(self):
+        """Проверка: курсорные страницы проходят ленту без повторов."""
+        url = reverse('posts:group_posts', args=[self.group.slug])
+        seen = []
+        query = ''
+        while True:
+            page_obj = self.client.get(url + query).context['page_obj']
+            seen.extend(post.pk for post in page_obj)
+            if not page_obj.has_next():
+                break
+            query = f'?after={page_obj.next_cursor}'
+        self.assertEqual(len(seen), self.TEST_POSTS_CONT)
+        self.assertEqual(len(set(seen)), self.TEST_POSTS_CONT)
+
+        # Возврат назад по курсору дает первую страницу
+        response = self.client.get(
+            f'{url}?before={page_obj.previous_cursor}')
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            seen[:settings.PAGE_SIZE]
+        )
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    @override_settings(PAGINATION_MODE='cursor')
+    def test_cursor_direction_in_cache_key(self):
+        """Проверка: страницы до и после одного курсора кешируются
+        отдельно."""
+        cache.clear()
+        url = reverse('posts:main-view')
+        cursor = self.client.get(url).context['page_obj'].next_cursor
+        for query in (f'?before={cursor}', f'?after={cursor}'):
+            with self.subTest(query=query):
+                response = self.client.get(url + query)
+                for post in response.context['page_obj']:
+                    self.assertContains(
+                        response,
+                        reverse('posts:post_detail', args=[post.pk])
+                    )
+
+    def test_broken_cursor_gives_first_page(self):
+        """Проверка: неверный курсор открывает первую страницу."""
+        response = self.client.get(
+            reverse('posts:main-view') + '?after=broken')
+        self.assertEqual(len(response.context['page_obj']), settings.PAGE_SIZE)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+
+@override_settings(COMMENTS_PAGE_SIZE=5)
+class CommentsViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост с комментариями',
+            author=cls.user,
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def add_comments(self, count):
+        start = Comment.objects.count()
+        for i in range(start, start + count):
+            commentator = User.objects.create_user(username=f'user{i}')
+            Comment.objects.create(
+                post=self.post, author=commentator, text=f'{i} комментарий')
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                reverse('posts:post_detail', args=[self.post.pk]))
+        return len(queries)
+
+    def test_post_detail_queries_do_not_grow(self):
+        """Проверка: число запросов не зависит от числа комментариев."""
+        self.add_comments(1)
+        expected = self.count_queries()
+        self.add_comments(4)
+        self.assertEqual(self.count_queries(), expected)
+
+    def test_comment_pages_cover_all_comments(self):
+        """Проверка: фрагменты комментариев проходят их без повторов."""
+        self.add_comments(12)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        page = response.context['comments']
+        seen = [comment.pk for comment in page]
+        self.assertEqual(len(seen), 5)
+        # Кнопка догружает фрагменты скриптом.
+        self.assertContains(response, 'data-fragment=')
+        self.assertContains(response, 'js/comments.js')
+
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        while page.has_next():
+            response = self.client.get(f'{url}?after={page.next_cursor}')
+            self.assertTemplateUsed(response, 'includes/comment_list.html')
+            self.assertTemplateNotUsed(response, 'base.html')
+            page = response.context['comments']
+            seen.extend(comment.pk for comment in page)
+        self.assertEqual(
+            seen,
+            list(self.post.comments.order_by(
+                '-created', '-pk').values_list('pk', flat=True))
+        )
+
 
 # Тестирование подписок
 class TaskFollowTests(TestCase):
@@ -362,3 +541,77 @@ class TaskFollowTests(TestCase):
         self.assertIn(new_post, response.context['page_obj'].object_list)
         response = self.nonfollower_client.get(reverse('posts:follow_index'))
         self.assertNotIn(new_post, response.context['page_obj'].object_list)
+
+    def test_unfollow_prunes_feed(self):
+        """Проверка: после отписки посты автора уходят из ленты."""
+        new_post = Post.objects.create(
+            author=self.a_user,
+            text='Got this text to test'
+        )
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow', args=[self.a_user.username]))
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertNotIn(new_post, response.context['page_obj'].object_list)
+
+    def test_follow_backfills_feed(self):
+        """Проверка: после подписки в ленте есть прежние посты автора."""
+        old_post = Post.objects.create(
+            author=self.a_user,
+            text='Got this text to test'
+        )
+        self.nonfollower_client.get(reverse(
+            'posts:profile_follow', args=[self.a_user.username]))
+        response = self.nonfollower_client.get(reverse('posts:follow_index'))
+        self.assertIn(old_post, response.context['page_obj'].object_list)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_is_pulled(self):
+        """Проверка: посты популярного автора подмешиваются при чтении."""
+        new_post = Post.objects.create(
+            author=self.a_user,
+            text='Got this text to test'
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=new_post).exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertIn(new_post, response.context['page_obj'].object_list)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_followers_backfill_deferred(self):
+        """Проверка: посты автора, опустившегося до порога fan-out,
+        раскладываются подписчикам после коммита, а не в запросе."""
+        self.nonfollower_client.get(reverse(
+            'posts:profile_follow', args=[self.a_user.username]))
+        new_post = Post.objects.create(
+            author=self.a_user,
+            text='Got this text to test'
+        )
+        scheduled = len(connection.run_on_commit)
+        self.nonfollower_client.get(reverse(
+            'posts:profile_unfollow', args=[self.a_user.username]))
+        self.assertEqual(len(connection.run_on_commit), scheduled + 1)
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=new_post).exists())
+
+        signals.backfill_followers(self.a_user.pk)
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertIn(new_post, response.context['page_obj'].object_list)
+
+    def test_follow_keeps_unrelated_cache(self):
+        """Проверка: подписка не очищает весь кеш."""
+        cache.set('unrelated_key', 'value')
+        self.nonfollower_client.get(reverse(
+            'posts:profile_follow', args=[self.a_user.username]))
+        self.assertEqual(cache.get('unrelated_key'), 'value')
+
+    def test_follow_feed_cached_per_user(self):
+        """Проверка: закешированная лента подписок не видна другим."""
+        other_author = User.objects.create_user(username='OtherAuthor')
+        Follow.objects.create(user=self.nf_user, author=other_author)
+        Post.objects.create(author=self.a_user, text='Пост первого автора')
+        Post.objects.create(author=other_author, text='Пост второго автора')
+
+        self.follower_client.get(reverse('posts:follow_index'))
+        response = self.nonfollower_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Пост второго автора')
+        self.assertNotContains(response, 'Пост первого автора')
@@ -0,0 +1,151 @@
+"""Миниатюры картинок постов и кеш их адресов.
+
+Геометрия и параметры миниатюр берутся из настроек (thumbnail_variants),
+поэтому фоновая задача, команда backfill_thumbnails и шаблоны создают
+и ищут одни и те же миниатюры. Адреса готовых миниатюр лежат в кеше по
+имени картинки и параметрам варианта: карточки целой страницы находят
+их одним get_many, недостающие ищутся в kvstore sorl-thumbnail одним
+запросом, а создаются только миниатюры, которых нет и там.
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+from core.thumbnails import stored_thumbnails
+
+logger = logging.getLogger(__name__)
+
+
+def thumbnail_variants():
+    """Миниатюры поста: {вариант: (геометрия, параметры)}.
+
+    WebP-вариант шаблон отдает через <picture> браузерам, которые
+    его понимают.
+    """
+    geometry = settings.POST_THUMBNAIL_GEOMETRY
+    options = settings.POST_THUMBNAIL_OPTIONS
+    return {
+        'thumbnail': (geometry, options),
+        'thumbnail_webp': (geometry, {
+            **options,
+            'format': 'WEBP',
+            'quality': settings.POST_IMAGE_QUALITY,
+        }),
+    }
+
+
+def _cache_key(name, geometry, options):
+    # Параметры входят в ключ: после их смены старые адреса не находятся.
+    raw = json.dumps([name, geometry, options], sort_keys=True)
+    return f'post_thumbnail:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def _get_thumbnails(image):
+    return {
+        label: get_thumbnail(image, geometry, **options)
+        for label, (geometry, options) in thumbnail_variants().items()
+    }
+
+
+def _ready_urls(name, thumbnails):
+    """{ключ кеша: (вариант, адрес)} миниатюр, которые есть в хранилище;
+    миниатюры, которые sorl не смог создать (он только пишет это
+    в лог), пропускаются."""
+    variants = thumbnail_variants()
+    return {
+        _cache_key(name, *variants[label]): (label, thumbnail.url)
+        for label, thumbnail in thumbnails.items() if thumbnail.exists()
+    }
+
+
+def _remember(ready):
+    cache.set_many(
+        {key: url for key, (_, url) in ready.items()},
+        thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+    )
+
+
+def generate_thumbnails(image):
+    """Создает миниатюры картинки и запоминает их адреса.
+
+    image — поле картинки или имя файла в хранилище. Возвращает
+    {вариант: миниатюра}; адреса запоминаются только для созданных.
+    """
+    thumbnails = _get_thumbnails(image)
+    _remember(_ready_urls(getattr(image, 'name', image), thumbnails))
+    return thumbnails
+
+
+def thumbnail_urls(images):
+    """Адреса миниатюр картинок: {имя картинки: {вариант: адрес}}.
+
+    Адреса из кеша берутся одним get_many. Для остальных картинок
+    готовые миниатюры ищутся в kvstore sorl-thumbnail одним запросом
+    (core.thumbnails.stored_thumbnails), и только недостающие создаются
+    через sorl-thumbnail. Найденные адреса кладутся в кеш одним set_many.
+    """
+    variants = thumbnail_variants()
+    keys = {
+        _cache_key(image.name, geometry, options): (image.name, label)
+        for image in images
+        for label, (geometry, options) in variants.items()
+    }
+    found = cache.get_many(list(keys))
+    urls = {image.name: {} for image in images}
+    for key, url in found.items():
+        name, label = keys[key]
+        urls[name][label] = url
+
+    missing = [image for image in images
+               if len(urls[image.name]) < len(variants)]
+    stored = stored_thumbnails({
+        (image.name, label): (image, geometry, options)
+        for image in missing
+        for label, (geometry, options) in variants.items()
+    })
+    ready = {}
+    for image in missing:
+        thumbnails = {
+            label: stored[image.name, label]
+            for label in variants if (image.name, label) in stored
+        }
+        if len(thumbnails) < len(variants):
+            try:
+                thumbnails = _get_thumbnails(image)
+            except Exception:
+                logger.exception('Миниатюры %s не созданы', image.name)
+                continue
+        image_ready = _ready_urls(image.name, thumbnails)
+        urls[image.name] = dict(image_ready.values())
+        ready.update(image_ready)
+    _remember(ready)
+    return urls
+
+
+class PageThumbnails:
+    """Адреса миниатюр постов страницы, найденные за один раз.
+
+    Ничего не ищет, пока шаблон не спросит первую карточку: если
+    страница целиком взята из кеша фрагментов, кеш миниатюр не трогается.
+    """
+
+    def __init__(self, posts):
+        self.posts = posts
+        self._urls = None
+
+    def get(self, post):
+        """{вариант: адрес} для поста страницы или None для чужого."""
+        if self._urls is None:
+            images = {post.pk: post.image for post in self.posts
+                      if post.image}
+            urls = thumbnail_urls(list(images.values()))
+            self._urls = {pk: urls[image.name]
+                          for pk, image in images.items()}
+        if post.pk not in self._urls and post.image:
+            return None
+        return self._urls.get(post.pk, {})
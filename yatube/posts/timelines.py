@@ -0,0 +1,126 @@
+"""Материализованные ленты подписок (гибридный fan-out).
+
+Новый пост раскладывается по лентам подписчиков при записи. Посты
+авторов, у которых подписчиков больше settings.TIMELINE_FANOUT_LIMIT,
+не раскладываются: лента читателя подмешивает их при чтении.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+
+from .models import AuthorStat, Follow, Post, TimelineEntry
+
+BATCH_SIZE = 500
+
+
+def followers_count(author_id):
+    return (AuthorStat.objects.filter(author_id=author_id)
+            .values_list('followers_count', flat=True).first() or 0)
+
+
+def is_pulled(author_id):
+    """Посты автора читаются при запросе ленты, а не раскладываются."""
+    return followers_count(author_id) > settings.TIMELINE_FANOUT_LIMIT
+
+
+def _insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Кладет новый пост в ленты подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    _insert([
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    ])
+
+
+def _copy(user_id, posts):
+    """Кладет посты в ленту читателя одним INSERT ... SELECT.
+
+    Строки не проходят через Python, поэтому подписка на автора
+    с тысячами постов и пересборка лент не упираются в bulk_create.
+    Посты, которые уже лежат в ленте, пропускаются.
+    """
+    rows = posts.exclude(timeline_entries__user_id=user_id).order_by()
+    sql, params = rows.values_list('pk', 'pub_date').query.sql_with_params()
+    quote = connection.ops.quote_name
+    opts = TimelineEntry._meta
+    columns = ', '.join(
+        quote(opts.get_field(name).column)
+        for name in ('user', 'post', 'pub_date')
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(opts.db_table)} ({columns}) '
+            f'SELECT %s, copied.* FROM ({sql}) copied',
+            (user_id, *params)
+        )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту читателя посты автора, на которого он подписался."""
+    if is_pulled(author_id):
+        return
+    _copy(user_id, Post.objects.filter(author_id=author_id))
+
+
+def backfill_followers(author_id):
+    """Раскладывает посты автора всем подписчикам.
+
+    Нужно, когда автор опускается до порога fan-out: пока он был
+    «популярным», его посты в ленты не попадали.
+    """
+    followers = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    for user_id in followers.iterator():
+        backfill(user_id, author_id)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты читателя посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def rebuild(user_id):
+    """Собирает ленту читателя заново по его подпискам."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    authors = Follow.objects.filter(
+        user_id=user_id).values_list('author_id', flat=True)
+    for author_id in authors:
+        backfill(user_id, author_id)
+
+
+def pulled_authors(user):
+    """Авторы из подписок читателя, чьи посты подмешиваются при чтении."""
+    return list(
+        AuthorStat.objects.filter(
+            author__following__user=user,
+            followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+        ).values_list('author_id', flat=True)
+    )
+
+
+def follow_feed(user, pulled=None):
+    """Посты ленты подписок: материализованная часть плюс подмешанная.
+
+    Без подмешанных авторов лента идет по индексу записей читателя
+    в порядке (дата, id) поста, который совпадает с порядком постов.
+    """
+    posts = Post.objects.select_related('group', 'author')
+    if pulled is None:
+        pulled = pulled_authors(user)
+    if not pulled:
+        return posts.filter(timeline_entries__user=user).order_by(
+            F('timeline_entries__pub_date').desc(),
+            F('timeline_entries__post_id').desc(),
+        )
+    entries = TimelineEntry.objects.filter(user=user).values('post_id')
+    return posts.filter(Q(pk__in=entries) | Q(author_id__in=pulled))
@@ -20,6 +20,12 @@ urlpatterns = [
     path('create/', views.post_create, name='post_create'),
     # Редактирование поста
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    # Следующие страницы комментариев
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     # Каменты поста
     path(
         'posts/<int:post_id>/comment/',
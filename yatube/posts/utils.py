@@ -1,10 +1,239 @@
+import base64
+import binascii
+import hashlib
+
+from django.core.cache import cache
 from django.core.paginator import Page, Paginator
+from django.core.exceptions import EmptyResultSet
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
 
 from django.conf import settings
 
+CURSOR_AFTER = 'after'
+CURSOR_BEFORE = 'before'
+
+# Общий тег всех лент постов, см. posts.caching.
+POSTS_TAG = 'posts'
+
+
+def _encode_cursor(value, pk) -> str:
+    raw = f'{value.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(token):
+    """Разбирает курсор, для битого токена возвращает None."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        value, pk = raw.decode().split('|')
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if value is None:
+        return None
+    return value, pk
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator с закешированным COUNT и сокращенной навигацией.
+
+    Размер ленты хранится в кеше по тексту ее запроса и может
+    устареть не больше чем на settings.PAGE_COUNT_CACHE_TIMEOUT
+    секунд: новые посты COUNT не сбрасывают, иначе при частых
+    записях он выполнялся бы почти на каждый запрос.
+    """
+    ELLIPSIS = '…'
+
+    def _count_cache_key(self):
+        try:
+            sql = str(self.object_list.query)
+        except (AttributeError, EmptyResultSet):
+            return None
+        digest = hashlib.md5(sql.encode()).hexdigest()
+        return f'page_count:{digest}'
+
+    @cached_property
+    def count(self):
+        key = self._count_cache_key()
+        if key is None:
+            return super().count
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, settings.PAGE_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def page(self, number):
+        # Paginator.page обрезает страницу по count; устаревший COUNT
+        # влияет только на навигацию, а страница всегда полная.
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self)
+
+    def get_elided_page_range(self, number=1, on_each_side=2, on_ends=1):
+        """Номера страниц вокруг текущей, первые и последние.
+
+        Повторяет Paginator.get_elided_page_range из Django 3.2, но
+        возвращает список: навигация выводится на странице дважды.
+        """
+        number = self.validate_number(number)
+        num_pages = self.num_pages
+        if num_pages <= (on_each_side + on_ends) * 2:
+            return list(self.page_range)
+
+        pages = []
+        if number > (1 + on_each_side + on_ends) + 1:
+            pages.extend(range(1, on_ends + 1))
+            pages.append(self.ELLIPSIS)
+            pages.extend(range(number - on_each_side, number + 1))
+        else:
+            pages.extend(range(1, number + 1))
+
+        if number < (num_pages - on_each_side - on_ends) - 1:
+            pages.extend(range(number + 1, number + on_each_side + 1))
+            pages.append(self.ELLIPSIS)
+            pages.extend(range(num_pages - on_ends + 1, num_pages + 1))
+        else:
+            pages.extend(range(number + 1, num_pages + 1))
+        return pages
+
+
+class CursorPage(Page):
+    """Страница ленты, выбранная по ключу (дата, id) без OFFSET.
+
+    Общее число страниц не считается: вместо номеров шаблон получает
+    курсоры соседних страниц. В `number` лежат направление и курсор
+    текущей страницы, чтобы его можно было использовать в ключах кеша.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, number, paginator,
+                 next_cursor=None, previous_cursor=None):
+        super().__init__(object_list, number, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def next_page_number(self):
+        return self.next_cursor
+
+    def previous_page_number(self):
+        return self.previous_cursor
+
+
+class CursorPaginator(CachedCountPaginator):
+    """Keyset-пагинатор: каждая страница стоит одинаково на любой глубине.
+
+    Лента сортируется по (`field`, pk) по убыванию, pk разрешает
+    совпадения дат. Явный order_by ленты сохраняется: он должен
+    сортировать по тем же значениям, например по их копиям
+    в связанной таблице.
+    """
+
+    def __init__(self, object_list, per_page, field='pub_date'):
+        super().__init__(object_list, per_page)
+        self.field = field
+
+    @property
+    def page_range(self):
+        # Номера страниц в курсорном режиме не выводятся, COUNT не нужен.
+        return range(0)
+
+    def get_elided_page_range(self, number=1, **kwargs):
+        return []
+
+    def _cursor_for(self, obj) -> str:
+        return _encode_cursor(getattr(obj, self.field), obj.pk)
+
+    @cached_property
+    def ordering(self):
+        return (tuple(self.object_list.query.order_by)
+                or (f'-{self.field}', '-pk'))
+
+    def _older(self, value, pk):
+        field = self.field
+        return self.object_list.filter(
+            **{f'{field}__lte': value}
+        ).exclude(
+            **{field: value, 'pk__gte': pk}
+        ).order_by(*self.ordering)
+
+    def _newer(self, value, pk):
+        field = self.field
+        return self.object_list.filter(
+            **{f'{field}__gte': value}
+        ).exclude(
+            **{field: value, 'pk__lte': pk}
+        ).order_by(*self.ordering).reverse()
+
+    def get_page(self, after=None, before=None) -> CursorPage:
+        after = after and _decode_cursor(after)
+        before = before and _decode_cursor(before)
+        size = self.per_page
+
+        if before:
+            rows = list(self._newer(*before)[:size + 1])
+            has_previous = len(rows) > size
+            rows = rows[:size][::-1]
+            has_next = True
+        else:
+            if after:
+                queryset = self._older(*after)
+            else:
+                queryset = self.object_list.order_by(*self.ordering)
+            rows = list(queryset[:size + 1])
+            has_next = len(rows) > size
+            rows = rows[:size]
+            has_previous = bool(after)
+
+        if not rows:
+            # Ушли за край ленты — отдаем первую страницу,
+            # как Paginator.get_page поступает с неверным номером.
+            if after or before:
+                return self.get_page()
+            return CursorPage(rows, 1, self)
+
+        # Направление входит в номер: ?after=X и ?before=X — разные
+        # страницы, а номер попадает в ключи кеша фрагментов.
+        number = (
+            f'{CURSOR_AFTER}:{_encode_cursor(*after)}' if after
+            else f'{CURSOR_BEFORE}:{_encode_cursor(*before)}' if before
+            else 1
+        )
+        return CursorPage(
+            rows,
+            number,
+            self,
+            next_cursor=self._cursor_for(rows[-1]) if has_next else None,
+            previous_cursor=(
+                self._cursor_for(rows[0]) if has_previous else None
+            ),
+        )
+
+
+def _get_page(request, posts, mode=None) -> Page:
+    """Страница ленты в режиме `offset` (?page=) или `cursor`.
+
+    Режим по умолчанию берется из settings.PAGINATION_MODE; курсор
+    в запросе (?after= / ?before=) всегда включает режим `cursor`.
+    """
+    after = request.GET.get(CURSOR_AFTER)
+    before = request.GET.get(CURSOR_BEFORE)
+    mode = mode or settings.PAGINATION_MODE
+
+    if mode == 'cursor' or after or before:
+        paginator = CursorPaginator(posts, settings.PAGE_SIZE)
+        return paginator.get_page(after=after, before=before)
 
-def _get_page(request, posts) -> Page:
-    paginator = Paginator(posts, settings.PAGE_SIZE)
+    paginator = CachedCountPaginator(posts, settings.PAGE_SIZE)
     page_num = request.GET.get('page')
     page_obj = paginator.get_page(page_num)
     return page_obj
@@ -1,5 +1,5 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.cache import cache
 from django.shortcuts import (
     get_object_or_404,
     redirect,
@@ -8,21 +8,38 @@ from django.shortcuts import (
 )
 from django.utils import timezone
 
+from core.cache_tags import tag_versions
+
+from .caching import author_tag, follow_feed_tags, group_tag
+from .counters import author_posts_count
 from .forms import PostForm, CommentForm
 from .models import Group, Post, User, Follow
-from .utils import _get_page
+from .thumbnails import PageThumbnails
+from .timelines import follow_feed, pulled_authors
+from .utils import (
+    CURSOR_AFTER,
+    CURSOR_BEFORE,
+    POSTS_TAG,
+    CursorPage,
+    CursorPaginator,
+    _get_page
+)
 
 
 # Главная страница
 def index(request):
     template = 'posts/index.html'
     posts = Post.objects.select_related('group', 'author').all()
+    cache_version = tag_versions(POSTS_TAG)
 
     page_obj = _get_page(request, posts)
 
     context = {
+        'cache_version': cache_version,
         'page_obj': page_obj,
-        'pages_count': page_obj.paginator.page_range,
+        'page_thumbnails': PageThumbnails(page_obj),
+        'pages_count': page_obj.paginator.get_elided_page_range(
+            page_obj.number),
     }
     return render(request, template, context)
 
@@ -42,13 +59,17 @@ def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('group', 'author').all()
+    cache_version = tag_versions(group_tag(group.pk))
 
     page_obj = _get_page(request, posts)
 
     context = {
+        'cache_version': cache_version,
         'group': group,
         'page_obj': page_obj,
-        'pages_count': page_obj.paginator.page_range
+        'page_thumbnails': PageThumbnails(page_obj),
+        'pages_count': page_obj.paginator.get_elided_page_range(
+            page_obj.number),
     }
     return render(request, template, context)
 
@@ -56,8 +77,11 @@ def group_posts(request, slug):
 # Профиль пользоватаеля.
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
+    author = get_object_or_404(
+        User.objects.select_related('stat'),
+        username=username
+    )
+    posts = author.posts.select_related('group').all()
 
     following = (request.user.is_authenticated
                  and Follow.objects.filter(
@@ -65,12 +89,16 @@ def profile(request, username):
                      author=author
                  ).exists())
 
+    cache_version = tag_versions(author_tag(author.pk))
     page_obj = _get_page(request, posts)
 
     context = {
-        'posts_count': posts.count,
+        'cache_version': cache_version,
+        'posts_count': author_posts_count(author),
         'page_obj': page_obj,
-        'pages_count': page_obj.paginator.page_range,
+        'page_thumbnails': PageThumbnails(page_obj),
+        'pages_count': page_obj.paginator.get_elided_page_range(
+            page_obj.number),
         'author': author,
         'following': following
     }
@@ -79,18 +107,43 @@ def profile(request, username):
 
 # Страница поста.
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comms = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stat', 'group'),
+        pk=post_id
+    )
     form = CommentForm()
     context = {
-        'posts_cont': post.author.posts.count(),
+        'posts_cont': author_posts_count(post.author),
         'post': post,
-        'comments': comms,
+        'comments': _get_comments_page(request, post),
         'form': form,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+# Следующие страницы комментариев фрагментом HTML.
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': _get_comments_page(request, post),
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
+def _get_comments_page(request, post) -> CursorPage:
+    comments = post.comments.select_related('author')
+    paginator = CursorPaginator(
+        comments,
+        settings.COMMENTS_PAGE_SIZE,
+        field='created',
+    )
+    return paginator.get_page(
+        after=request.GET.get(CURSOR_AFTER),
+        before=request.GET.get(CURSOR_BEFORE),
+    )
+
+
 # Страница создания поста.
 @login_required(login_url='users:login')
 def post_create(request):
@@ -150,16 +203,17 @@ def add_comment(request, post_id):
 @login_required(login_url='users:login')
 def follow_index(request):
     template = 'posts/follow.html'
-    posts = Post.objects.select_related(
-        'group',
-        'author').filter(
-        author__following__user=request.user
-    ).all()
+    pulled = pulled_authors(request.user)
+    posts = follow_feed(request.user, pulled)
+    cache_version = tag_versions(*follow_feed_tags(request.user, pulled))
 
     page_obj = _get_page(request, posts)
     context = {
+        'cache_version': cache_version,
         'page_obj': page_obj,
-        'pages_count': page_obj.paginator.page_range,
+        'page_thumbnails': PageThumbnails(page_obj),
+        'pages_count': page_obj.paginator.get_elided_page_range(
+            page_obj.number),
     }
     return render(request, template, context)
 
@@ -167,18 +221,11 @@ def follow_index(request):
 @login_required(login_url='users:login')
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if (Follow.objects.filter(
-            user=request.user,
-            author=author).exists()
-            or author == request.user):
-        return redirect('posts:follow_index')
-
-    follow = Follow.objects.create(
-        author=author,
-        user=request.user
-    )
-    follow.save()
-    cache.clear()
+    if author != request.user:
+        Follow.objects.get_or_create(
+            author=author,
+            user=request.user
+        )
     return redirect('posts:follow_index')
 
 
@@ -191,5 +238,4 @@ def profile_unfollow(request, username):
         user=request.user
     )
     follow.delete()
-    cache.clear()
     return redirect('posts:follow_index')
@@ -0,0 +1,26 @@
+// Кнопка «Показать еще комментарии» догружает следующую страницу
+// фрагментом (data-fragment) вместо перезагрузки поста. Без JS
+// работает обычная ссылка href.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('a[data-fragment]');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  link.classList.add('disabled');
+  fetch(link.dataset.fragment, {credentials: 'same-origin'})
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status);
+      }
+      return response.text();
+    })
+    .then(function (html) {
+      // Фрагмент содержит комментарии и, если есть, следующую кнопку.
+      link.insertAdjacentHTML('beforebegin', html);
+      link.remove();
+    })
+    .catch(function () {
+      window.location.href = link.href;
+    });
+});
@@ -39,7 +39,7 @@ urlpatterns = [
         name='password_reset_complete'
     ),
     path(
-        'reset/<uid64>/<token>/',
+        'reset/<uidb64>/<token>/',
         PasswordResetConfirmView.as_view(
             template_name='users/password_reset_confirm.html'),
         name='password_reset_confirm'
@@ -52,11 +52,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.NPlusOneMiddleware',
+    'core.middleware.MemoryPeakMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -77,6 +81,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.cache.cache_timeouts',
             ],
         },
     },
@@ -96,6 +101,36 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+# Версии тегов (core.cache_tags) и фрагменты лент должны быть общими
+# для всех воркеров, иначе запись поста сбрасывает ленты только в том
+# процессе, который ее принял. Для нескольких воркеров задайте адрес
+# memcached в YATUBE_MEMCACHED; без него кеш свой у каждого процесса,
+# и фрагменты лент живут недолго (FEED_CACHE_TIMEOUT).
+MEMCACHED_LOCATION = os.environ.get('YATUBE_MEMCACHED')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    } if not MEMCACHED_LOCATION else {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': MEMCACHED_LOCATION,
+    },
+    # Персональные ленты подписок: LocMemCache вытесняет давно
+    # не читанные записи (LRU), MAX_ENTRIES ограничивает память.
+    'follow_feed': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'follow_feed',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+            'CULL_FREQUENCY': 10,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -146,9 +181,118 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 PAGE_SIZE = 10
+# Комментариев на странице поста и в каждом следующем фрагменте.
+COMMENTS_PAGE_SIZE = 20
+# Режим пагинации лент: 'offset' (?page=) или 'cursor' (?after=/?before=).
+PAGINATION_MODE = 'offset'
+# Сколько секунд может устареть закешированное число постов в ленте.
+PAGE_COUNT_CACHE_TIMEOUT = 60
+# Посты авторов с большим числом подписчиков не раскладываются по лентам,
+# а подмешиваются в ленту подписок при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+# Время жизни фрагментов лент. Ключи включают версии тегов ленты,
+# поэтому фрагмент устаревает сразу после изменения постов — но только
+# если версии общие для всех воркеров. С кешем процесса другие воркеры
+# об изменении не узнают, поэтому фрагменты живут 20 секунд.
+FEED_CACHE_TIMEOUT = 60 * 60 * 6 if MEMCACHED_LOCATION else 20
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Строки лога запросов (core.middleware.ServerTimingMiddleware)
+# в формате JSON, по одной на запрос. Каталог создается при первой
+# записи.
+LOG_DIR = os.path.join(BASE_DIR, 'logs')
+
+
+def log_file(name):
+    return {
+        'class': 'core.log.LazyRotatingFileHandler',
+        'filename': os.path.join(LOG_DIR, name),
+        'maxBytes': 50 * 1024 * 1024,
+        'backupCount': 5,
+    }
+
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'requests': log_file('requests.log'),
+        'slow_queries': log_file('slow_queries.log'),
+        'memory': log_file('memory.log'),
+    },
+    'loggers': {
+        'yatube.requests': {
+            'handlers': ['requests'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'yatube.memory': {
+            'handlers': ['memory'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Запросы к базе дольше этого числа секунд попадают в лог
+# slow_queries.log и в админку (core.slow_queries); None — не проверять.
+SLOW_QUERY_THRESHOLD = 0.1
+
+# Поиск N+1 (core.nplusone): запрос, выполненный за один запрос к сайту
+# больше NPLUSONE_THRESHOLD раз, пишется в лог yatube.nplusone,
+# а в строгом режиме вызывает ошибку.
+NPLUSONE_DETECTION = DEBUG
+NPLUSONE_THRESHOLD = 5
+NPLUSONE_STRICT = False
+
+# Профили запросов сотрудников (core.profiling): каталог файлов,
+# шаг выборочного профилировщика в секундах и срок жизни токена.
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILING_INTERVAL = 0.005
+PROFILING_TOKEN_MAX_AGE = 60 * 60 * 24
+
+# Память (core.memory): маршруты, для которых в лог memory.log пишется
+# память каждого запроса; глубина стека, строк в отчете и число
+# хранимых снимков tracemalloc.
+MEMORY_PEAK_VIEWS = [
+    'posts:post_detail',
+    'posts:post_comments',
+    'posts:post_create',
+    'posts:post_edit',
+]
+MEMORY_TRACE_FRAMES = 5
+MEMORY_TOP_STATS = 20
+MEMORY_SNAPSHOTS_KEPT = 5
+
+# Файлы метрик процессов (core.metrics), по одному на процесс.
+# Страница /metrics/ суммирует все файлы каталога; файлы завершенных
+# процессов удаляет новый процесс при первой записи.
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+# Токен сборщика метрик для заголовка Authorization: Bearer;
+# без токена страница /metrics/ отвечает 404.
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN')
+
+# Считает созданные миниатюры для /metrics/.
+THUMBNAIL_BACKEND = 'core.thumbnails.CountingThumbnailBackend'
+# Миниатюра картинки поста: по этим параметрам posts.tasks создает
+# миниатюры заранее, а тег {% post_thumbnails %} находит их в шаблонах.
+POST_THUMBNAIL_GEOMETRY = '960x339'
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+# Потоки фоновых задач posts.tasks: картинки постов, раскладка лент.
+# 0 — задачи выполняются после коммита в том же потоке.
+BACKGROUND_WORKERS = 2
+# Картинки больше отклоняются формой до декодирования.
+POST_IMAGE_MAX_PIXELS = 40_000_000
+# Загруженная картинка уменьшается до этих размеров и пересжимается.
+POST_IMAGE_MAX_SIZE = (2560, 2560)
+POST_IMAGE_QUALITY = 85
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
@@ -0,0 +1,24 @@
+"""Настройки для тестов: manage.py test и pytest (pytest.ini).
+
+Фоновые задачи выполняются в том же потоке: фоновая запись не спорит
+с тестом за блокировку общей базы в памяти. Файлы логов не пишутся,
+файлы метрик лежат во временном каталоге, а не в yatube/metrics.
+"""
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import LOGGING
+
+BACKGROUND_WORKERS = 0
+
+# Файлы завершенных процессов удаляет следующий запуск (core.metrics).
+METRICS_DIR = os.path.join(tempfile.gettempdir(), 'yatube_test_metrics')
+
+LOGGING = {
+    **LOGGING,
+    'handlers': {
+        name: {'class': 'logging.NullHandler'}
+        for name in LOGGING['handlers']
+    },
+}
@@ -18,6 +18,8 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core import views as core_views
+
 
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'
@@ -29,6 +31,11 @@ urlpatterns = [
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
     path('admin/', admin.site.urls),
+    path('metrics/', core_views.metrics, name='metrics'),
+    path('profiling/token/', core_views.profile_token, name='profile_token'),
+    path('profiling/<int:pk>/', core_views.profile_download,
+         name='profile_download'),
+    path('memory/', core_views.memory, name='memory'),
 ]
 
 if settings.DEBUG: